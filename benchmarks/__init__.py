@@ -0,0 +1,87 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Helpers for the benchmarks, which time the library on generated entries
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from tests import import_revelation
+
+import random
+import time
+
+
+WORDS = ("mail", "bank", "shop", "forum", "cloud", "server", "router", "backup", "wiki", "photos")
+
+
+def make_entries(count, seed = 1):
+    "Generates website entries with names, descriptions and all fields set, the same ones for a seed"
+
+    entry = import_revelation().entry
+    generator = random.Random(seed)
+    entries = []
+
+    for i in range(count):
+        word = generator.choice(WORDS)
+
+        e = entry.WebEntry()
+        e.name = "%s %s %d" % (word.capitalize(), generator.choice(WORDS), i)
+        e.description = "Account at %s%d.example.com" % (word, i % 997)
+        e.updated = 1500000000 + generator.randrange(300000000)
+        e[entry.URLField] = "https://%s%d.example.com/login" % (word, i % 997)
+        e[entry.UsernameField] = "user%d" % generator.randrange(50)
+        e[entry.EmailField] = "user%d@example.com" % generator.randrange(50)
+        e[entry.PasswordField] = "%016x" % generator.getrandbits(64)
+
+        entries.append(e)
+
+    return entries
+
+
+def make_entrystore(count, seed = 1):
+    "Generates an entrystore with website entries at the top level"
+
+    entrystore = import_revelation().store.EntryStore()
+    entrystore.add_entries([(None, e) for e in make_entries(count, seed)])
+
+    return entrystore
+
+
+def report(name, seconds):
+    "Prints a timing"
+
+    print("%-40s %10.4f s" % (name, seconds))
+
+
+def timed(function, *args, repeat = 3):
+    "Calls a function repeatedly, returns the fastest time and the last result"
+
+    best, result = None, None
+
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+
+        if best is None or seconds < best:
+            best = seconds
+
+    return best, result
@@ -0,0 +1,63 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Times reading, exporting and copying stored entries
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# Usage: python3 -m benchmarks.entries [entries]
+#
+
+from . import import_revelation, make_entrystore, report, timed
+
+import sys
+
+
+def get_entries(entrystore):
+    "Fetches every entry in an entrystore"
+
+    iter = entrystore.iter_children(None)
+
+    while iter is not None:
+        entrystore.get_entry(iter)
+        iter = entrystore.iter_next(iter)
+
+
+def main(count = 20000):
+    revelation = import_revelation()
+    entrystore = make_entrystore(count)
+
+    print("%d entries" % count)
+
+    seconds = timed(get_entries, entrystore)[0]
+    print("%-40s %10.2f us" % ("get_entry per entry", seconds / count * 1e6))
+
+    # values are counted on the first request only, so each run needs a new store
+    seconds = min(timed(make_entrystore(count).get_popular_values, revelation.entry.UsernameField, repeat = 1)[0] for i in range(3))
+    report("get_popular_values", seconds)
+
+    report("XML export", timed(revelation.datahandler.RevelationXML().export_data, entrystore)[0])
+    report("import_entry", timed(lambda: revelation.store.EntryStore().import_entry(entrystore, None))[0])
+    report("snapshot for a background save", timed(revelation.store.EntrySnapshot, entrystore)[0])
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
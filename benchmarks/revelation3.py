@@ -0,0 +1,71 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Times saving and opening version 3 files with different thread counts
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# Usage: python3 -m benchmarks.revelation3 [entries] [threads...]
+#
+
+from . import import_revelation, make_entrystore, report, timed
+
+import os
+import sys
+import zlib
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+
+
+def single_stream(xml, key):
+    "Compresses and encrypts a whole document in one go, like a single threaded save"
+
+    cipher = AES.new(key, AES.MODE_GCM, nonce = get_random_bytes(12))
+
+    return cipher.encrypt_and_digest(zlib.compress(xml))
+
+
+def main(count = 100000, *threads):
+    datahandler = import_revelation().datahandler
+    entrystore = make_entrystore(count)
+
+    handler = datahandler.Revelation3()
+    keydata = handler.derive_key("password")
+    xml = datahandler.RevelationXML().export_data(entrystore).encode()
+
+    print("%d entries, %.1f MB of XML, %d processors" % (count, len(xml) / 1e6, os.cpu_count()))
+
+    report("derive key", timed(handler.derive_key, "password")[0])
+    report("serialize", timed(datahandler.RevelationXML().export_data, entrystore)[0])
+    report("compress and encrypt in one stream", timed(single_stream, xml, keydata[2])[0])
+
+    for count in threads or (1, 2, 4, 8, 16):
+        handler.threads = count
+        seconds, data = timed(handler.export_data, entrystore, "password", keydata)
+        report("save with %d threads" % count, seconds)
+
+        # opening includes deriving the key, which takes the same time for any thread count
+        report("open with %d threads" % count, timed(handler.import_data, data, "password")[0])
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,58 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Times ranked searches, with substring and fuzzy matching
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# Usage: python3 -m benchmarks.search [entries...]
+#
+
+from . import import_revelation, make_entrystore, report, timed
+
+import sys
+
+
+# terms matching every entry, about a fifth of them, and a few of them
+TERMS = ("example", "router", "user7@")
+FUZZY = ("exmpl", "rtr", "bnk9")
+
+
+def main(*counts):
+    data = import_revelation().data
+
+    for count in counts or (1000, 10000, 100000):
+        entrysearch = data.EntrySearch(make_entrystore(count))
+
+        # the first search builds the index, which is kept from then on
+        entrysearch.find_ranked(TERMS[0])
+
+        for string in TERMS:
+            report("%d entries, substring %s" % (count, string), timed(entrysearch.find_ranked, string)[0])
+
+        entrysearch.fuzzy = True
+
+        for string in FUZZY:
+            report("%d entries, fuzzy %s" % (count, string), timed(entrysearch.find_ranked, string)[0])
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,113 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Times removing selected descendants from large selections
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# Usage: python3 -m benchmarks.selection [rows] [pairwise rows]
+#
+
+from . import import_revelation, make_entries, make_entrystore, report, timed
+
+import random
+import sys
+
+
+def filter_pairwise(entrystore, iters):
+    "Removes descendants by checking every pair of iters, like filter_parents used to"
+
+    parents = []
+
+    for child in iters:
+        for parent in iters:
+            if entrystore.is_ancestor(parent, child):
+                break
+
+        else:
+            parents.append(child)
+
+    return parents
+
+
+def get_iters(entrystore, parent = None):
+    "Gets all iters below a parent, depth-first"
+
+    iters = []
+    iter = entrystore.iter_children(parent)
+
+    while iter is not None:
+        iters.append(iter)
+        iters.extend(get_iters(entrystore, iter))
+        iter = entrystore.iter_next(iter)
+
+    return iters
+
+
+def make_nested(count):
+    "Generates an entrystore with folders of ten subfolders, each holding ten entries"
+
+    revelation = import_revelation()
+    entries = []
+
+    for i, e in enumerate(make_entries(count)):
+        if i % 100 == 0:
+            folder = len(entries)
+            entries.append((None, revelation.entry.FolderEntry()))
+
+        if i % 10 == 0:
+            subfolder = len(entries)
+            entries.append((folder, revelation.entry.FolderEntry()))
+
+        entries.append((subfolder, e))
+
+    entrystore = revelation.store.EntryStore()
+    entrystore.add_entries(entries)
+
+    return entrystore
+
+
+def run(name, entrystore, count, pairwise):
+    "Times filtering a shuffled selection of rows, with some repeated"
+
+    generator = random.Random(1)
+    iters = get_iters(entrystore)
+    iters = generator.sample(iters, min(count, len(iters)))
+    iters += generator.sample(iters, len(iters) // 100)
+
+    seconds, parents = timed(entrystore.filter_parents, iters)
+    report("%s, %d rows" % (name, len(iters)), seconds)
+
+    iters = iters[:pairwise]
+    seconds, expected = timed(filter_pairwise, entrystore, iters, repeat = 1)
+    report("%s pairwise, %d rows" % (name, len(iters)), seconds)
+
+    if entrystore.filter_parents(iters) != expected:
+        raise AssertionError("filter_parents differs from the pairwise version")
+
+
+def main(count = 50000, pairwise = 3000):
+    run("top level", make_entrystore(count), count, pairwise)
+    run("nested", make_nested(count), count, pairwise)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -28,6 +28,7 @@ from . import config
 from . import datahandler
 from . import io
 from . import entry
+from . import store
 from . import data
 from . import ui
 from . import dialog
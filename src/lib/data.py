@@ -23,19 +23,28 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
-from . import datahandler, entry
+from . import datahandler, entry, store, util
+from .store import COLUMN_NAME
 
 from gi.repository import GObject, Gtk, Gdk, GLib
+import bisect
+import fnmatch
+import heapq
+import re
+import shlex
 import time
 
 
-COLUMN_NAME  = 0
-COLUMN_ICON  = 1
-COLUMN_ENTRY = 2
-
 SEARCH_NEXT     = "next"
 SEARCH_PREVIOUS = "prev"
 
+# milliseconds to wait for more typing before filtering, and seconds to match entries for at a time
+FILTER_DELAY    = 150
+FILTER_SLICE    = 0.01
+
+# shorter names for some query keys
+QUERY_ALIASES   = {"db": "database", "desc": "description", "host": "hostname", "phone": "phonenumber", "user": "username"}
+
 
 class Clipboard(GObject.GObject):
     "A normal text-clipboard"
@@ -186,7 +195,7 @@ class EntryClipboard(GObject.GObject):
     def set(self, entrystore, iters):
         "Copies entries from an entrystore to the clipboard"
 
-        copystore = EntryStore()
+        copystore = store.EntryStore()
 
         for iter in entrystore.filter_parents(iters):
             copystore.import_entry(entrystore, iter)
@@ -202,6 +211,353 @@ GObject.signal_new("content-toggled", EntryClipboard,
                    (GObject.TYPE_BOOLEAN, ))
 
 
+class EntryFilter(Gtk.TreeModelFilter):
+    "A view of an entrystore for tree views, which only shows some entries and the folders containing them"
+
+    def __init__(self, entrystore):
+        Gtk.TreeModelFilter.__init__(self, child_model=entrystore)
+        self.entrystore = entrystore
+        self.hidden     = set()
+
+        self.set_visible_func(self.__cb_visible)
+
+    def __cb_visible(self, model, treeiter, data = None):
+        "Checks if a row of the entrystore is shown"
+
+        # entries added since the filter was set are shown
+        return model.get_node(treeiter.user_data) not in self.hidden
+
+    def __get_treeiter(self, iter):
+        "Gets the tree iter of the row for an iter, if it is shown"
+
+        path = self.get_path(iter)
+
+        return path is not None and Gtk.TreeModelFilter.get_iter(self, Gtk.TreePath(path)) or None
+
+    def folder_expanded(self, iter, expanded):
+        "Sets the expanded state of an entry"
+
+        self.entrystore.folder_expanded(iter, expanded)
+
+    def get_entry(self, iter):
+        "Fetches a read-only entry"
+
+        return self.entrystore.get_entry(iter)
+
+    def get_iter(self, path):
+        "Gets the iter shown at a path"
+
+        if not path:
+            return None
+
+        childpath = self.convert_path_to_child_path(Gtk.TreePath(tuple(path)))
+
+        return childpath is not None and self.entrystore.get_iter(childpath.get_indices()) or None
+
+    def get_path(self, iter):
+        "Gets the path an iter is shown at, or None if it is hidden"
+
+        if iter is None:
+            return None
+
+        path = self.convert_child_path_to_path(Gtk.TreePath(self.entrystore.get_path(iter)))
+
+        return path is not None and tuple(path.get_indices()) or None
+
+    def iter_n_children(self, iter):
+        "Gets the number of children shown for an iter"
+
+        treeiter = self.__get_treeiter(iter)
+
+        if iter is not None and treeiter is None:
+            return 0
+
+        return Gtk.TreeModelFilter.iter_n_children(self, treeiter)
+
+    def iter_nth_child(self, iter, n):
+        "Gets the nth child shown for an iter"
+
+        treeiter = self.__get_treeiter(iter)
+
+        if iter is not None and treeiter is None:
+            return None
+
+        child = Gtk.TreeModelFilter.iter_nth_child(self, treeiter, n)
+
+        return child is not None and self.get_iter(Gtk.TreeModelFilter.get_path(self, child)) or None
+
+    def set_matches(self, iters):
+        "Shows only the given entries and the folders containing them"
+
+        shown = set()
+
+        for iter in iters:
+            while iter is not None and iter not in shown:
+                shown.add(iter)
+                iter = self.entrystore.iter_parent(iter)
+
+        self.hidden = set()
+        iter = self.entrystore.iter_traverse_next(None)
+
+        while iter is not None:
+            if iter not in shown:
+                self.hidden.add(iter)
+
+            iter = self.entrystore.iter_traverse_next(iter)
+
+        self.refilter()
+
+
+class EntryQuery(object):
+    "A search string parsed into clauses which entries must match, such as type:shell or -folder:archive, and text to search for"
+
+    # query keys for the fields which can be searched, named after their ids
+    fields  = None
+
+    def __init__(self, string, casesensitive = False, stripaccents = False):
+        self.string         = string
+        self.casesensitive  = casesensitive
+        self.stripaccents   = stripaccents
+        self.text           = string
+        self.scoped         = False
+
+        # clauses as ( cost, negated, check ), checks on nodes are ordered by cost,
+        # and indexes give the set of nodes matching positive clauses
+        self.__nodeclauses  = []
+        self.__entryclauses = []
+        self.__indexes      = []
+
+        try:
+            lexer = shlex.shlex(string, posix = True)
+            lexer.whitespace_split = True
+            lexer.commenters = ""
+            lexer.escape = ""
+            terms = list(lexer)
+
+        except ValueError:
+            terms = string.split()
+
+        words = []
+
+        for term in terms:
+            negated = len(term) > 1 and term[0] == "-"
+            key, separator, value = (negated and term[1:] or term).partition(":")
+
+            # only known clauses can be negated, other terms like -rf are text
+            if separator and value and self.__add_clause(QUERY_ALIASES.get(key.lower(), key.lower()), value, negated):
+                continue
+
+            words.append(term)
+
+        self.__nodeclauses.sort(key = lambda clause: clause[0])
+
+        # strings without any clauses are searched for as they are
+        if self.scoped:
+            self.text = " ".join(words)
+
+    def __add_clause(self, key, value, negated):
+        "Adds a clause for a key, or returns False if the key or value is not known"
+
+        test = self.__get_test(value)
+
+        if key == "type":
+            entrytypes = set(entrytype for entrytype in entry.ENTRYLIST if test(entrytype.id))
+
+            def index(entrystore):
+                return set().union(*[entrystore.get_type_iters(entrytype) for entrytype in entrytypes])
+
+            self.__add_node_clause(0, negated, lambda entrystore, iter: entrystore.get_entrytype(iter) in entrytypes, index)
+
+        elif key == "updated":
+            period = self.__get_period(value)
+
+            if period is None:
+                return False
+
+            start, end = period
+
+            def index(entrystore):
+                return set(entrystore.get_updated_iters(start, end))
+
+            self.__add_node_clause(1, negated, lambda entrystore, iter: (start is None or entrystore.get_updated(iter) >= start) and (end is None or entrystore.get_updated(iter) < end), index)
+
+        elif key == "folder":
+            self.__add_node_clause(2, negated, lambda entrystore, iter: self.__check_folders(entrystore, iter, test), None)
+
+        elif key == "name":
+            self.__add_node_clause(3, negated, lambda entrystore, iter: test(entrystore.get_value(iter, COLUMN_NAME)), self.__get_literal(value))
+
+        elif key == "description":
+            self.__add_entry_clause(negated, lambda e: test(e.description), self.__get_literal(value))
+
+        elif key == "notes":
+            self.__add_entry_clause(negated, lambda e: test(e.notes), self.__get_literal(value))
+
+        elif key in self.__get_fields():
+            fieldtype = self.__get_fields()[key]
+            self.__add_entry_clause(negated, lambda e: e.has_field(fieldtype) and test(e[fieldtype] or ""), self.__get_literal(value))
+
+        else:
+            return False
+
+        return True
+
+    def __add_entry_clause(self, negated, check, literal):
+        "Adds a clause checked on entries, with the literal text which matching values contain"
+
+        self.__entryclauses.append((4, negated, check))
+        self.__add_index(negated, literal)
+
+    def __add_index(self, negated, index):
+        "Adds an index for a clause, which is either a function giving the matching nodes or literal text they contain"
+
+        self.scoped = True
+
+        if negated or index is None:
+            return
+
+        elif isinstance(index, str):
+            self.__indexes.append(lambda entrystore: entrystore.get_text_iters(index))
+
+        else:
+            self.__indexes.append(index)
+
+    def __add_node_clause(self, cost, negated, check, index):
+        "Adds a clause checked on nodes, without unpacking their entries"
+
+        self.__nodeclauses.append((cost, negated, check))
+        self.__add_index(negated, index)
+
+    def __check_folders(self, entrystore, iter, test):
+        "Checks if the name of any folder an entry is in passes a test"
+
+        iter = entrystore.iter_parent(iter)
+
+        while iter is not None:
+            if test(entrystore.get_value(iter, COLUMN_NAME)):
+                return True
+
+            iter = entrystore.iter_parent(iter)
+
+        return False
+
+    def __get_fields(self):
+        "Gets the field types which can be searched, by query key"
+
+        # the map is built on first use, since the entry module is not
+        # fully loaded yet when this one is imported
+        if EntryQuery.fields is None:
+            EntryQuery.fields = dict((fieldtype.id.split("-")[-1], fieldtype) for fieldtype in entry.FIELDLIST if fieldtype.datatype != entry.DATATYPE_PASSWORD)
+
+        return EntryQuery.fields
+
+    def __get_literal(self, value):
+        "Gets the longest text which any value matching a pattern contains, or None if it is too short to look up"
+
+        if "[" in value:
+            return None
+
+        literal = max(re.split(r"[*?]", value), key = len)
+
+        return len(literal) >= 3 and literal or None
+
+    def __get_period(self, value):
+        "Gets the range of times, as a start and end which may be None, for a date like 2024-01-01, 2024-01 or 2024 with an optional comparison"
+
+        operator, date = re.match(r"(<=|>=|<|>|=)?(.*)", value).groups()
+
+        for format, step in (("%Y-%m-%d", (0, 0, 1)), ("%Y-%m", (0, 1, 0)), ("%Y", (1, 0, 0))):
+            try:
+                date = time.strptime(date, format)
+                break
+
+            except ValueError:
+                continue
+
+        else:
+            return None
+
+        # mktime() carries days and months past the end of a month or year over
+        start = time.mktime(date)
+        end = time.mktime((date.tm_year + step[0], date.tm_mon + step[1], date.tm_mday + step[2], 0, 0, 0, 0, 0, -1))
+
+        if operator == "<":
+            return None, start
+
+        elif operator == "<=":
+            return None, end
+
+        elif operator == ">":
+            return end, None
+
+        elif operator == ">=":
+            return start, None
+
+        return start, end
+
+    def __get_test(self, value):
+        "Gets a test for values, which must match a pattern with * or ? in it as a whole, or else contain the value"
+
+        if not self.casesensitive:
+            value = util.fold_text(value, self.stripaccents)
+
+        if "*" in value or "?" in value or "[" in value:
+            match = re.compile(fnmatch.translate(value)).match
+
+            def test(text):
+                return match(text) is not None
+
+        else:
+            def test(text):
+                return value in text
+
+        if self.casesensitive:
+            return test
+
+        return lambda text: test(util.fold_text(text, self.stripaccents))
+
+    def check_entry(self, entrystore, iter):
+        "Checks if a node matches the clauses on values, unpacking its entry only if there are any"
+
+        if len(self.__entryclauses) == 0:
+            return True
+
+        e = entrystore.get_entry(iter)
+
+        for cost, negated, check in self.__entryclauses:
+            if bool(check(e)) == negated:
+                return False
+
+        return True
+
+    def check_node(self, entrystore, iter):
+        "Checks if a node matches the clauses which need not unpack its entry, cheapest first"
+
+        for cost, negated, check in self.__nodeclauses:
+            if bool(check(entrystore, iter)) == negated:
+                return False
+
+        return True
+
+    def get_candidates(self, entrystore, fuzzy = False):
+        "Gets the nodes which may match the query from the indexes of an entrystore, in pre-order, or None if no index applies"
+
+        indexes = list(self.__indexes)
+
+        # fuzzy matches need not contain any part of the text
+        if self.text and not fuzzy:
+            indexes.append(lambda entrystore: entrystore.get_text_iters(self.text))
+
+        candidates = [iters for iters in (index(entrystore) for index in indexes) if iters is not None]
+
+        if len(candidates) == 0:
+            return None
+
+        candidates.sort(key = len)
+
+        return entrystore.sort_iters(candidates[0].intersection(*candidates[1:]))
+
+
 class EntrySearch(GObject.GObject):
     "Handles searching in an EntryStore"
 
@@ -212,319 +568,431 @@ class EntrySearch(GObject.GObject):
         self.folders        = True
         self.namedesconly   = False
         self.casesensitive  = False
+        self.ignoreaccents  = False
+        self.fuzzy          = False
 
-    def find(self, string, entrytype = None, offset = None, direction = SEARCH_NEXT):
-        "Searches for an entry, starting at the given offset"
+        # the pending filter source, and the last filter done, as ( revision, options, string, matches )
+        self.__filter_source    = None
+        self.__filter_last      = None
 
-        iter = offset
+        # the last query parsed
+        self.__query            = None
 
-        while True:
+    def __cb_filter_match(self, string, entrytype, candidates, matches, ranked, limit, callback):
+        "Matches filter candidates until the time slice is used up, and calls back once all are done"
 
-            if direction == SEARCH_NEXT:
-                iter = self.entrystore.iter_traverse_next(iter)
+        end = time.monotonic() + FILTER_SLICE
 
-            else:
-                iter = self.entrystore.iter_traverse_prev(iter)
+        for iter in candidates:
+            score = self.score(iter, string, entrytype)
 
-            # if we've wrapped around, return None
-            if self.entrystore.get_path(iter) == self.entrystore.get_path(offset):
-                return None
+            if score is not None:
+                matches.append(iter)
+                self.__rank(ranked, limit, (score, -len(matches), iter))
 
-            if self.match(iter, string, entrytype):
-                return iter
+            if time.monotonic() >= end:
+                return True
 
-    def find_all(self, string, entrytype = None):
-        "Searches for all entries matching a term"
+        self.__filter_source = None
+        self.__filter_last = (self.entrystore.revision, self.__get_options(entrytype), string, matches)
 
-        matches = []
-        iter = self.entrystore.iter_children(None)
+        callback(string, matches, [result[2] for result in sorted(ranked, reverse = True)])
 
-        while iter is not None:
+        return False
 
-            if self.match(iter, string, entrytype):
-                matches.append(iter)
+    def __cb_filter_start(self, string, entrytype, limit, callback):
+        "Starts matching entries for a filter, once typing has paused"
 
-            iter = self.entrystore.iter_traverse_next(iter)
+        candidates = self.__get_candidates(string)
+        last = self.__filter_last
 
-        return matches
+        # when a string only grows, the entries matching it are among the earlier matches,
+        # which does not hold for queries with clauses
+        if last is not None and last[:2] == (self.entrystore.revision, self.__get_options(entrytype)) and self.__contains(string, last[2]) and not self.__get_query(string).scoped and not EntryQuery(last[2]).scoped:
+            if len(last[3]) < len(candidates):
+                candidates = last[3]
 
-    def match(self, iter, string, entrytype = None):
-        "Check if an entry matches the search criteria"
+        self.__filter_source = GLib.idle_add(self.__cb_filter_match, string, entrytype, iter(candidates), [], [], limit, callback)
 
-        if iter is None or not string:
-            return False
+        return False
 
-        e = self.entrystore.get_entry(iter)
+    def __check(self, iter, query, entrytype):
+        "Checks if an entry is searched and matches the clauses of a query, unpacking it only for clauses on values"
 
         # check entry type
-        if type(e) == entry.FolderEntry and not self.folders:
+        nodetype = self.entrystore.get_entrytype(iter)
+
+        if nodetype == entry.FolderEntry and not self.folders:
             return False
 
-        if entrytype is not None and type(e) not in (entrytype, entry.FolderEntry):
+        if entrytype is not None and nodetype not in (entrytype, entry.FolderEntry):
             return False
 
-        # check entry fields
-        items = [e.name, e.description, e.notes]
+        return query.check_node(self.entrystore, iter) and query.check_entry(self.entrystore, iter)
 
-        if not self.namedesconly:
-            items.extend([field.value for field in e.fields if field.value != ""])
+    def __contains(self, string, substring):
+        "Checks if a string contains another, with the case sensitivity of the search"
 
-        # run the search
-        for item in items:
-            if self.casesensitive and string in item:
-                return True
+        if self.casesensitive:
+            return substring in string
 
-            elif not self.casesensitive and string.lower() in item.lower():
-                return True
+        # fuzzy matching ignores case on its own
+        elif self.fuzzy:
+            return substring.lower() in string.lower()
 
-        return False
+        return util.fold_text(substring, self.ignoreaccents) in util.fold_text(string, self.ignoreaccents)
 
+    def __get_candidates(self, string):
+        "Gets the entries which may match a string, in pre-order"
 
-class EntryStore(Gtk.TreeStore):
-    "A data structure for storing entries"
+        candidates = self.__get_query(string).get_candidates(self.entrystore, self.fuzzy)
 
-    def __init__(self):
-        Gtk.TreeStore.__init__(
-            self,
-            GObject.TYPE_STRING,    # name
-            GObject.TYPE_STRING,    # icon
-            GObject.TYPE_PYOBJECT   # entry
-        )
-
-        self.changed = False
-        self.connect("row-has-child-toggled", self.__cb_iter_has_child)
+        if candidates is not None:
+            return candidates
 
-        self.set_sort_func(COLUMN_NAME, self.__cmp)
-        self.set_sort_column_id(COLUMN_NAME, Gtk.SortType.ASCENDING)
+        # without any index to narrow them down, all entries are candidates
+        candidates = []
+        iter = self.entrystore.iter_traverse_next(None)
 
-    def __cmp(self, treemodel, iter1, iter2, user_data=None):
-        name1 = treemodel.get_value(iter1, COLUMN_NAME).strip().lower()
-        name2 = treemodel.get_value(iter2, COLUMN_NAME).strip().lower()
+        while iter is not None:
+            candidates.append(iter)
+            iter = self.entrystore.iter_traverse_next(iter)
 
-        return (name1 > name2) - (name1 < name2)
+        return candidates
 
-    def __cb_iter_has_child(self, widget, path, iter):
-        "Callback for iters having children"
+    def __get_items(self, iter):
+        "Gets the searchable values of an entry with their weights"
 
-        if self.iter_n_children(iter) == 0:
-            self.folder_expanded(iter, False)
+        e = self.entrystore.get_entry(iter)
 
-    def add_entry(self, e, parent = None, sibling = None):
-        "Adds an entry"
+        # names rank above descriptions, which rank above the rest, and secret fields are not searched
+        items = [(3, e.name), (2, e.description), (1, e.notes)]
 
-        # place after parent if it's not a folder
-        if parent is not None and type(self.get_entry(parent)) != entry.FolderEntry:
-            iter = self.insert_after(self.iter_parent(parent), parent)
+        if not self.namedesconly:
+            items.extend([(1, field.value) for field in e.fields if field.value and field.datatype != entry.DATATYPE_PASSWORD])
 
-        # place before sibling, if given
-        elif sibling is not None:
-            iter = self.insert_before(parent, sibling)
+        return items
 
-        # otherwise, append to parent
-        else:
-            iter = self.append(parent)
+    def __get_options(self, entrytype):
+        "Gets the options which affect matching"
 
-        self.update_entry(iter, e)
-        self.changed = True
+        return (entrytype, self.folders, self.namedesconly, self.casesensitive, self.ignoreaccents, self.fuzzy)
 
-        return iter
+    def __get_query(self, string):
+        "Gets the query for a search string, which is parsed only when it changes"
 
-    def clear(self):
-        "Removes all entries"
+        if self.__query is None or (self.__query.string, self.__query.casesensitive, self.__query.stripaccents) != (string, self.casesensitive, self.ignoreaccents):
+            self.__query = EntryQuery(string, self.casesensitive, self.ignoreaccents)
 
-        Gtk.TreeStore.clear(self)
-        self.changed = False
+        return self.__query
 
-    def copy_entry(self, iter, parent = None, sibling = None):
-        "Copies an entry recursively"
+    def __match(self, iter, string):
+        "Checks if any searchable value of an entry matches a string"
 
-        newiter = self.add_entry(self.get_entry(iter), parent, sibling)
+        if self.fuzzy:
+            return any(self.__score_item(string, item) is not None for weight, item in self.__get_items(iter))
 
-        for i in range(self.iter_n_children(iter)):
-            child = self.iter_nth_child(iter, i)
-            self.copy_entry(child, newiter)
+        elif self.casesensitive:
+            return any(string in item for weight, item in self.__get_items(iter))
 
-        return newiter
+        string = util.fold_text(string, self.ignoreaccents)
 
-    def filter_parents(self, iters):
-        "Removes all descendants from the list of iters"
+        # the values are kept folded and joined by null characters, so one search covers them all
+        if "\0" in string:
+            return any(string in util.fold_text(item, self.ignoreaccents) for weight, item in self.__get_items(iter))
 
-        parents = []
+        haystack, end = self.entrystore.get_haystack(iter, self.ignoreaccents)
 
-        for child in iters:
-            for parent in iters:
-                if self.is_ancestor(parent, child):
-                    break
+        return haystack.find(string, 0, end if self.namedesconly else len(haystack)) != -1
 
-            else:
-                parents.append(child)
+    def __rank(self, ranked, limit, result):
+        "Adds a result to a heap of the best results, which is kept below a limit"
 
-        return parents
+        if len(ranked) < limit:
+            heapq.heappush(ranked, result)
 
-    def folder_expanded(self, iter, expanded):
-        "Sets the expanded state of an entry"
+        elif result > ranked[0]:
+            heapq.heapreplace(ranked, result)
 
-        e = self.get_entry(iter)
+    def __score_item(self, string, item):
+        "Scores how well a value matches a string, folding both if they only match that way"
 
-        if e is None or type(e) != entry.FolderEntry:
-            return
+        score = util.fuzzy_score(string, item, self.casesensitive)
 
-        elif expanded:
-            self.set_value(iter, COLUMN_ICON, e.openicon)
+        if score is None and not self.casesensitive:
+            score = util.fuzzy_score(util.fold_text(string, self.ignoreaccents), util.fold_text(item, self.ignoreaccents), True)
 
-        else:
-            self.set_value(iter, COLUMN_ICON, e.icon)
+        return score
 
-    def get_entry(self, iter):
-        "Fetches data for an entry"
+    def cancel_filter(self):
+        "Cancels a pending filter"
 
-        if iter is None:
-            return None
+        if self.__filter_source is not None:
+            GLib.source_remove(self.__filter_source)
+            self.__filter_source = None
 
-        e = self.get_value(iter, COLUMN_ENTRY)
+    def filter(self, string, entrytype, callback, limit = 10):
+        "Finds all entries matching a term in the background, replacing any pending filter, and calls back with them and the best ones"
+
+        self.cancel_filter()
+        self.__filter_source = GLib.timeout_add(FILTER_DELAY, self.__cb_filter_start, string, entrytype, limit, callback)
+
+    def find(self, string, entrytype = None, offset = None, direction = SEARCH_NEXT):
+        "Searches for an entry, starting at the given offset"
 
-        if e is None:
+        if not string:
             return None
 
+        # the candidates are in pre-order, so the search starts next to the
+        # offset and wraps around, stopping before the offset itself
+        candidates = self.__get_candidates(string)
+        positions = [iter.position for iter in candidates]
+
+        if direction == SEARCH_NEXT:
+            split = 0 if offset is None else bisect.bisect_right(positions, offset.position)
+            order = candidates[split:] + candidates[:split]
+
         else:
-            return e.copy()
+            split = len(candidates) if offset is None else bisect.bisect_left(positions, offset.position)
+            order = candidates[:split][::-1] + candidates[split:][::-1]
 
-    def get_iter(self, path):
-        "Gets an iter from a path"
+        for iter in order:
+            if iter is not offset and self.match(iter, string, entrytype):
+                return iter
 
-        try:
-            if not path:
-                return None
+        return None
 
-            if isinstance(path, list):
-                path = tuple(path)
+    def find_all(self, string, entrytype = None):
+        "Searches for all entries matching a term"
 
-            return Gtk.TreeStore.get_iter(self, path)
+        if not string:
+            return []
 
-        except ValueError:
+        return [iter for iter in self.__get_candidates(string) if self.match(iter, string, entrytype)]
+
+    def find_ranked(self, string, entrytype = None, limit = 10):
+        "Searches for the entries matching a term best, best first"
+
+        if not string:
+            return []
+
+        ranked = []
+
+        for position, iter in enumerate(self.__get_candidates(string)):
+            score = self.score(iter, string, entrytype)
+
+            if score is not None:
+                self.__rank(ranked, limit, (score, -position, iter))
+
+        return [result[2] for result in sorted(ranked, reverse = True)]
+
+    def match(self, iter, string, entrytype = None):
+        "Check if an entry matches the search criteria"
+
+        if iter is None or not string:
+            return False
+
+        query = self.__get_query(string)
+
+        # queries with only clauses match all entries which pass them
+        return self.__check(iter, query, entrytype) and (not query.text or self.__match(iter, query.text))
+
+    def score(self, iter, string, entrytype = None):
+        "Scores how well an entry matches the search criteria, or returns None if it does not match"
+
+        if iter is None or not string:
             return None
 
-    def get_path(self, iter):
-        "Gets a path from an iter"
+        query = self.__get_query(string)
 
-        return iter is not None and Gtk.TreeStore.get_path(self, iter) or None
+        if not self.__check(iter, query, entrytype):
+            return None
 
-    def get_popular_values(self, fieldtype, threshold = 3):
-        "Gets popular values for a field type"
+        elif not query.text:
+            return 0
 
-        valuecount = {}
-        iter = self.iter_nth_child(None, 0)
+        # fuzzy matches are checked while scoring
+        elif not self.fuzzy and not self.__match(iter, query.text):
+            return None
 
-        while iter is not None:
-            e = self.get_entry(iter)
+        # the score of the best value counts, weighted by the field it is in
+        best = None
 
-            if not e.has_field(fieldtype):
-                iter = self.iter_traverse_next(iter)
-                continue
+        for weight, item in self.__get_items(iter):
+            score = self.__score_item(query.text, item)
 
-            value = e[fieldtype].strip()
+            if score is not None and (best is None or weight * score > best):
+                best = weight * score
 
-            if value != "":
-                if value not in valuecount:
-                    valuecount[value] = 0
+        return best
 
-                valuecount[value] += 1
 
-            iter = self.iter_traverse_next(iter)
+class EntryStore(store.EntryStore, GObject.GObject, Gtk.TreeModel):
+    "An entrystore which can be displayed in tree views"
 
-        popular = [value for value, count in valuecount.items() if count >= threshold]
-        popular.sort()
+    def __init__(self):
+        GObject.GObject.__init__(self)
+        store.EntryStore.__init__(self)
 
-        return popular
+        self.connect("row-has-child-toggled", self.__cb_iter_has_child)
 
-    def import_entry(self, source, iter, parent = None, sibling = None):
-        "Recursively copies an entry from a different entrystore"
+    def __cb_iter_has_child(self, widget, path, iter):
+        "Callback for iters having children"
 
-        if iter is not None:
-            copy = self.add_entry(source.get_entry(iter), parent, sibling)
-            parent, sibling = copy, None
+        iter = self.get_iter(path)
 
-        else:
-            copy = None
+        if self.iter_n_children(iter) == 0:
+            self.folder_expanded(iter, False)
+
+    def __get_iter(self, treeiter):
+        "Gets the iter for a tree iter"
 
-        newiters = []
-        for i in range(source.iter_n_children(iter)):
-            child = source.iter_nth_child(iter, i)
-            newiter = self.import_entry(source, child, parent, sibling)
-            newiters.append(newiter)
+        return treeiter is not None and self.get_node(treeiter.user_data) or None
 
-        return copy is not None and copy or newiters
+    def __get_result(self, iter):
+        "Converts an iter into a tree model result"
 
-    def iter_traverse_next(self, iter):
-        "Gets the 'logically next' iter"
+        if iter is None:
+            return (False, None)
 
-        # get the first child, if any
-        child = self.iter_nth_child(iter, 0)
-        if child is not None:
-            return child
+        return (True, self.__get_treeiter(iter))
 
-        # check for a sibling or, if not found, a sibling of any ancestors
-        parent = iter
-        while parent is not None:
-            sibling = parent.copy()
-            sibling = self.iter_next(sibling)
+    def __get_treeiter(self, iter):
+        "Gets a tree iter for an iter"
 
-            if sibling is not None:
-                return sibling
+        treeiter = Gtk.TreeIter()
+        treeiter.user_data = iter.id
 
-            parent = self.iter_parent(parent)
+        return treeiter
 
-        return None
+    def __get_treepath(self, path):
+        "Gets a tree path for a path"
 
-    def iter_traverse_prev(self, iter):
-        "Gets the 'logically previous' iter"
+        return path and Gtk.TreePath(path) or Gtk.TreePath.new()
 
-        # get the previous sibling, or parent, of the iter - if any
-        if iter is not None:
-            parent = self.iter_parent(iter)
-            index = self.get_path(iter)[-1]
+    def do_get_column_type(self, column):
+        "Gets the type of a column"
 
-            # if no sibling is found, return the parent
-            if index == 0:
-                return parent
+        return (GObject.TYPE_STRING, GObject.TYPE_STRING, GObject.TYPE_PYOBJECT)[column]
 
-            # otherwise, get the sibling
-            iter = self.iter_nth_child(parent, index - 1)
+    def do_get_flags(self):
+        "Gets the model flags"
 
-        # get the last, deepest child of the sibling or root, if any
-        while self.iter_n_children(iter) > 0:
-            iter = self.iter_nth_child(iter, self.iter_n_children(iter) - 1)
+        return Gtk.TreeModelFlags.ITERS_PERSIST
 
-        return iter
+    def do_get_iter(self, treepath):
+        "Gets a tree iter from a tree path"
 
-    def move_entry(self, iter, parent = None, sibling = None):
-        "Moves an entry"
+        return self.__get_result(self.get_iter(treepath.get_indices()))
 
-        newiter = self.copy_entry(iter, parent, sibling)
-        self.remove_entry(iter)
+    def do_get_n_columns(self):
+        "Gets the number of columns"
 
-        return newiter
+        return 3
 
-    def remove_entry(self, iter):
-        "Removes an entry, and its children if any"
+    def do_get_path(self, treeiter):
+        "Gets a tree path from a tree iter"
+
+        return self.__get_treepath(self.get_path(self.__get_iter(treeiter)))
+
+    def do_get_value(self, treeiter, column):
+        "Gets a column value for a tree iter"
+
+        return self.get_value(self.__get_iter(treeiter), column)
+
+    def do_iter_children(self, treeiter):
+        "Gets the first child of a tree iter"
+
+        return self.__get_result(self.iter_children(self.__get_iter(treeiter)))
+
+    def do_iter_has_child(self, treeiter):
+        "Checks if a tree iter has children"
+
+        return self.iter_n_children(self.__get_iter(treeiter)) > 0
+
+    def do_iter_n_children(self, treeiter):
+        "Gets the number of children of a tree iter"
+
+        return self.iter_n_children(self.__get_iter(treeiter))
+
+    def do_iter_next(self, treeiter):
+        "Moves a tree iter to its next sibling"
+
+        iter = self.iter_next(self.__get_iter(treeiter))
 
         if iter is None:
-            return None
+            return False
 
-        self.remove(iter)
-        self.changed = True
+        treeiter.user_data = iter.id
+        return True
 
-    def update_entry(self, iter, e):
-        "Updates an entry"
+    def do_iter_nth_child(self, treeiter, n):
+        "Gets the nth child of a tree iter"
 
-        if None in (iter, e):
-            return None
+        return self.__get_result(self.iter_nth_child(self.__get_iter(treeiter), n))
+
+    def do_iter_parent(self, treeiter):
+        "Gets the parent of a tree iter"
+
+        return self.__get_result(self.iter_parent(self.__get_iter(treeiter)))
+
+    def node_added(self, iter):
+        "Tells tree views about an added row"
+
+        self.row_inserted(self.__get_treepath(self.get_path(iter)), self.__get_treeiter(iter))
+
+        parent = self.iter_parent(iter)
+
+        if parent is not None and self.iter_n_children(parent) == 1:
+            self.row_has_child_toggled(self.__get_treepath(self.get_path(parent)), self.__get_treeiter(parent))
+
+    def node_changed(self, iter):
+        "Tells tree views about a changed row"
+
+        self.row_changed(self.__get_treepath(self.get_path(iter)), self.__get_treeiter(iter))
+
+    def node_moved(self, iter):
+        "Tells tree views about a moved row, after its old one was deleted"
+
+        # the row is only inserted, its children move along with it
+        path, treeiter = self.__get_treepath(self.get_path(iter)), self.__get_treeiter(iter)
+        self.row_inserted(path, treeiter)
+
+        if self.iter_n_children(iter) > 0:
+            self.row_has_child_toggled(path, treeiter)
+
+        parent = self.iter_parent(iter)
+
+        if parent is not None and self.iter_n_children(parent) == 1:
+            self.row_has_child_toggled(self.__get_treepath(self.get_path(parent)), self.__get_treeiter(parent))
+
+    def node_removed(self, parent, path):
+        "Tells tree views about a removed row"
+
+        self.row_deleted(self.__get_treepath(path))
+
+        if parent is not None and self.iter_n_children(parent) == 0:
+            self.row_has_child_toggled(self.__get_treepath(self.get_path(parent)), self.__get_treeiter(parent))
+
+    def nodes_added(self, parent, iters):
+        "Tells tree views about rows added in bulk"
+
+        # rows added below new rows are found by tree views when expanding them
+        for iter in iters:
+            path, treeiter = self.__get_treepath(self.get_path(iter)), self.__get_treeiter(iter)
+            self.row_inserted(path, treeiter)
+
+            if self.iter_n_children(iter) > 0:
+                self.row_has_child_toggled(path, treeiter)
+
+        if parent is not None and self.iter_n_children(parent) == len(iters):
+            self.row_has_child_toggled(self.__get_treepath(self.get_path(parent)), self.__get_treeiter(parent))
 
-        self.set_value(iter, COLUMN_NAME, e.name)
-        self.set_value(iter, COLUMN_ICON, e.icon)
-        self.set_value(iter, COLUMN_ENTRY, e.copy())
+    def nodes_reordered(self, parent, order):
+        "Tells tree views about reordered rows"
 
-        self.changed = True
+        treeiter = parent is not None and self.__get_treeiter(parent) or None
+        self.rows_reordered(self.__get_treepath(self.get_path(parent)), treeiter, order)
 
 
 class Timer(GObject.GObject):
@@ -31,7 +31,8 @@ from .gpass import GPass04, GPass05
 from .keepassxc import KeepassXCCSV
 from .netrc import NetRC
 from .pwsafe import PasswordSafe1, PasswordSafe2, MyPasswordSafe, MyPasswordSafeOld, PasswordGorilla
-from .rvl import RevelationXML, Revelation, Revelation2
+from .rvl import RevelationXML, Revelation, Revelation2, Revelation3
+from .rvl import KDF, KDF_NAMES, calibrate_kdf
 from .splashid import SplashIDCSV
 from .text import PlainText
 from .xhtml import XHTML
@@ -52,6 +53,7 @@ HANDLERS = [
     PlainText,
     Revelation,
     Revelation2,
+    Revelation3,
     SplashIDCSV,
     XHTML,
     RevelationXML
@@ -55,6 +55,9 @@ class DataHandler(object):
     importer    = False
     exporter    = False
     encryption  = False
+    journal     = False
+    kdf         = None
+    threads     = None
 
     def __init__(self):
         pass
@@ -64,6 +67,11 @@ class DataHandler(object):
 
         pass
 
+    def derive_key(self, password):
+        "Fallback method, subclasses which derive keys should override this"
+
+        return None
+
     def detect(self, input):
         "Fallback method, subclasses should override this"
 
@@ -24,7 +24,7 @@
 #
 
 from . import base
-from revelation import data, entry, util
+from revelation import entry, store, util
 
 import math
 import secrets
@@ -176,10 +176,10 @@ class FPM(base.DataHandler):
                 xml += "            <password>%s</password>\n" % self.__encrypt(cipher, e.get_field(entry.PasswordField).value.encode()).decode()
                 xml += "            <notes>%s</notes>\n" % self.__encrypt(cipher, e.description.encode()).decode()
 
-                path = entrystore.get_path(iter).to_string()
+                path = entrystore.get_path(iter)
 
                 if len(path) > 1:
-                    foldername = entrystore.get_entry(entrystore.get_iter(path[0])).name
+                    foldername = entrystore.get_entry(entrystore.get_iter(path[:1])).name
                     xml += "            <category>%s</category>\n" % self.__encrypt(cipher, foldername.encode()).decode()
 
                 else:
@@ -225,7 +225,7 @@ class FPM(base.DataHandler):
             raise base.FormatError
 
         # import entries into entrystore
-        entrystore = data.EntryStore()
+        entries = []
         folders = {}
 
         for node in dom.getElementsByTagName("PasswordItem"):
@@ -264,9 +264,13 @@ class FPM(base.DataHandler):
                         folderentry = entry.FolderEntry()
                         folderentry.name = content
 
-                        parent = entrystore.add_entry(folderentry)
+                        parent = len(entries)
                         folders[content] = parent
+                        entries.append((None, folderentry))
 
-            entrystore.add_entry(e, parent)
+            entries.append((parent, e))
+
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
 
         return entrystore
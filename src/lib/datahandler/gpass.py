@@ -24,7 +24,7 @@
 #
 
 from . import base
-from revelation import data, entry
+from revelation import entry, store
 
 import locale
 import re
@@ -128,7 +128,7 @@ class GPass04(base.DataHandler):
 
         plaintext = decrypt(input, password, b"GNOME Password Manager\n").decode()
 
-        entrystore = data.EntryStore()
+        entries = []
         lines = plaintext.splitlines()
 
         while len(lines) > 0:
@@ -154,7 +154,10 @@ class GPass04(base.DataHandler):
 
             e.description = re.sub("[\r\n]+", " ", d).strip()
 
-            entrystore.add_entry(e)
+            entries.append((None, e))
+
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
 
         return entrystore
 
@@ -281,8 +284,8 @@ class GPass05(base.DataHandler):
         while iter is not None:
             id += 1
 
-            path        = entrystore.get_path(iter).to_string()
-            parentpath  = ':'.join(path.split(':')[:-1])
+            path        = entrystore.get_path(iter)
+            parentpath  = path[:-1]
 
             if len(parentpath) > 0 and parentpath in foldermap:
                 parentid = foldermap[parentpath]
@@ -328,7 +331,7 @@ class GPass05(base.DataHandler):
 
         plaintext = decrypt(input, password, b"GPassFile version 1.1.0")
 
-        entrystore = data.EntryStore()
+        entries = []
         foldermap = {}
 
         while len(plaintext) > 0:
@@ -406,9 +409,12 @@ class GPass05(base.DataHandler):
             else:
                 parent = None
 
-            iter = entrystore.add_entry(e, parent)
-
             if type(e) == entry.FolderEntry:
-                foldermap[id] = iter
+                foldermap[id] = len(entries)
+
+            entries.append((parent, e))
+
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
 
         return entrystore
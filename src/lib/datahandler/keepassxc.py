@@ -23,7 +23,7 @@
 import csv
 import time
 
-from revelation import data, entry
+from revelation import entry, store
 from . import base
 
 
@@ -59,7 +59,7 @@ class KeepassXCCSV(base.DataHandler):
     def import_data(self, input, password):
         " Import data from a file into the entry store"
 
-        entrystore = data.EntryStore()
+        entries = []
 
         # Maintain a hash of folder names to folder entries so we
         # can use each category encountered to create a new folder
@@ -101,10 +101,14 @@ class KeepassXCCSV(base.DataHandler):
                 else:
                     folder = entry.FolderEntry()
                     folder.name = row[0]
-                    parent = entrystore.add_entry(folder)
+                    parent = len(entries)
                     folders[row[0]] = parent
+                    entries.append((None, folder))
 
                 # Add the entry
-                entrystore.add_entry(new_entry, parent)
+                entries.append((parent, new_entry))
+
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
 
         return entrystore
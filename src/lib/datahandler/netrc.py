@@ -24,7 +24,7 @@
 #
 
 from . import base
-from revelation import data, entry
+from revelation import entry, store
 from io import StringIO
 
 import shlex
@@ -73,7 +73,7 @@ class NetRC(base.DataHandler):
     def import_data(self, netrc, password = None):
         "Imports data from a netrc stream to an entrystore"
 
-        entrystore = data.EntryStore()
+        entries = []
 
         # set up a lexical parser
         datafp = StringIO(netrc)
@@ -121,7 +121,7 @@ class NetRC(base.DataHandler):
 
                 # if we find a new entry, break out of current field-collecting loop
                 if tt == "" or tt == "machine" or tt == "default" or tt == "macdef":
-                    entrystore.add_entry(e)
+                    entries.append((None, e))
                     lexer.push_token(tt)
                     break
 
@@ -139,4 +139,7 @@ class NetRC(base.DataHandler):
 
         datafp.close()
 
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
+
         return entrystore
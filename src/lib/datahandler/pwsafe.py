@@ -24,7 +24,7 @@
 #
 
 from . import base
-from revelation import data, entry
+from revelation import entry, store
 
 import locale
 import re
@@ -430,7 +430,7 @@ class PasswordSafe1(base.DataHandler):
 
         # load data
         db      = decrypt(SHA(password.encode() + salt).digest(), input[56:], iv)
-        entrystore  = data.EntryStore()
+        entries     = []
 
         while len(db) > 0:
 
@@ -452,7 +452,10 @@ class PasswordSafe1(base.DataHandler):
             e[entry.UsernameField]  = normalize_field(dbentry["username"])
             e[entry.PasswordField]  = normalize_field(dbentry["password"])
 
-            entrystore.add_entry(e)
+            entries.append((None, e))
+
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
 
         return entrystore
 
@@ -483,7 +486,7 @@ class PasswordSafe2(base.DataHandler):
 
         return ".".join(path)
 
-    def __setup_group(self, entrystore, groupmap, group):
+    def __setup_group(self, entries, groupmap, group):
         "Sets up a group folder, or returns an existing one"
 
         if group in (None, ""):
@@ -494,19 +497,20 @@ class PasswordSafe2(base.DataHandler):
 
         if "." in group:
             parent, groupname = group.rsplit(".", 1)
-            parentiter = self.__setup_group(entrystore, groupmap, parent)
+            parentref = self.__setup_group(entries, groupmap, parent)
 
         else:
             groupname = group
-            parentiter = None
+            parentref = None
 
         e = entry.FolderEntry()
         e.name = groupname
 
-        iter = entrystore.add_entry(e, parentiter)
-        groupmap[group] = iter
+        ref = len(entries)
+        entries.append((parentref, e))
+        groupmap[group] = ref
 
-        return iter
+        return ref
 
     def check(self, input):
         "Checks if the data is valid"
@@ -594,7 +598,7 @@ class PasswordSafe2(base.DataHandler):
 
         # load data
         db      = decrypt(SHA(password.encode() + salt).digest(), input[56:], iv)
-        entrystore  = data.EntryStore()
+        entries     = []
 
         # read magic entry
         for f in "magic", "version", "prefs":
@@ -645,12 +649,12 @@ class PasswordSafe2(base.DataHandler):
 
             elif ftype == FIELDTYPE_END:
                 if group not in (None, ""):
-                    parent = self.__setup_group(entrystore, groupmap, group)
+                    parent = self.__setup_group(entries, groupmap, group)
 
                 else:
                     parent = None
 
-                entrystore.add_entry(e, parent)
+                entries.append((parent, e))
 
                 e = entry.GenericEntry()
                 group = None
@@ -660,6 +664,9 @@ class PasswordSafe2(base.DataHandler):
 
             db = db[8 + flen:]
 
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
+
         return entrystore
 
 
@@ -25,23 +25,49 @@
 #
 
 from . import base
-from revelation import config, data, entry, util
+from revelation import config, entry, store, util
 
-from Cryptodome.Protocol.KDF import PBKDF2
-from Cryptodome.Hash import SHA1
+from Cryptodome.Protocol.KDF import PBKDF2, scrypt
+from Cryptodome.Hash import HMAC, SHA1, SHA256
 from Cryptodome.Random import get_random_bytes
 
-import defusedxml.minidom
+import collections
+import concurrent.futures
+import defusedxml
+import defusedxml.ElementTree
+import itertools
+import json
 import os
 import re
+import struct
+import time
 import zlib
 
-from xml.parsers.expat import ExpatError
 from Cryptodome.Cipher import AES
 
 import hashlib
 
 
+BLOCKSIZE   = 256 * 1024
+CHUNKSIZE   = 64 * 1024
+
+KDF_PBKDF2_SHA1     = 1
+KDF_PBKDF2_SHA256   = 2
+KDF_SCRYPT          = 3
+
+KDF_NAMES = {
+    "pbkdf2-sha1":      KDF_PBKDF2_SHA1,
+    "pbkdf2-sha256":    KDF_PBKDF2_SHA256,
+    "scrypt":           KDF_SCRYPT,
+}
+
+# bounds for parameters read from files, and minimum costs for writing them
+KDF_MINROUNDS   = 100000
+KDF_MINSCRYPT   = 2 ** 14
+KDF_MAXROUNDS   = 100000000
+KDF_MAXMEMORY   = 1024 ** 3
+
+
 class RevelationXML(base.DataHandler):
     "Handler for Revelation XML data"
 
@@ -56,81 +82,36 @@ class RevelationXML(base.DataHandler):
     def __lookup_entry(self, typename):
         "Looks up an entry type based on an identifier"
 
-        for entrytype in entry.ENTRYLIST:
-            if entrytype().id == typename:
-                return entrytype
+        try:
+            return entry.ENTRYMAP[typename]
 
-        else:
+        except KeyError:
             raise entry.EntryTypeError
 
     def __lookup_field(self, fieldname):
         "Looks up an entry field based on an identifier"
 
-        for fieldtype in entry.FIELDLIST:
-            if fieldtype.id == fieldname:
-                return fieldtype
-
-        else:
-            raise entry.EntryFieldError
-
-    def __xml_import_node(self, entrystore, node, parent = None):
-        "Imports a node into an entrystore"
-
         try:
+            return entry.FIELDMAP[fieldname]
 
-            # check the node
-            if node.nodeType == node.TEXT_NODE:
-                return
-
-            if node.nodeType != node.ELEMENT_NODE or node.nodeName != "entry":
-                raise base.FormatError
-
-            # create an entry, iter needed for children
-            e = self.__lookup_entry(node.attributes["type"].value)()
-            iter = entrystore.add_entry(e, parent)
-
-            # handle child nodes
-            for child in node.childNodes:
-
-                if child.nodeType != child.ELEMENT_NODE:
-                    continue
-
-                elif child.nodeName == "name":
-                    e.name = util.dom_text(child)
-
-                elif child.nodeName == "notes":
-                    e.notes = util.dom_text(child)
-
-                elif child.nodeName == "description":
-                    e.description = util.dom_text(child)
-
-                elif child.nodeName == "updated":
-                    e.updated = int(util.dom_text(child))
-
-                elif child.nodeName == "field":
-                    e[self.__lookup_field(child.attributes["id"].nodeValue)] = util.dom_text(child)
-
-                elif child.nodeName == "entry":
-                    if type(e) != entry.FolderEntry:
-                        raise base.DataError
+        except KeyError:
+            raise entry.EntryFieldError
 
-                    self.__xml_import_node(entrystore, child, iter)
+    def __xml_import(self, stream):
+        "Parses an iterable of XML data into a new entrystore"
 
-                else:
-                    raise base.FormatError
+        target = XMLImportTarget(self.__lookup_entry, self.__lookup_field)
+        parser = defusedxml.ElementTree.XMLParser(target = target)
 
-            # update entry with actual data
-            entrystore.update_entry(iter, e)
+        try:
+            for piece in stream:
+                parser.feed(piece)
 
-        except (entry.EntryTypeError, entry.EntryFieldError):
-            raise base.DataError
+            return parser.close()
 
-        except KeyError:
+        except (defusedxml.ElementTree.ParseError, defusedxml.DefusedXmlException):
             raise base.FormatError
 
-        except ValueError:
-            raise base.DataError
-
     def check(self, input):
         "Checks if the data is valid"
 
@@ -167,61 +148,77 @@ class RevelationXML(base.DataHandler):
         except (base.FormatError, base.VersionError):
             return False
 
-    def export_data(self, entrystore, password = None, parent = None, level = 0):
+    def export_data(self, entrystore, password = None, parent = None):
         "Serializes data into an XML stream"
 
-        xml = ""
-        tabs = "\t" * (level + 1)
+        return "".join(RevelationXML.export_stream(self, entrystore, parent))
 
-        for i in range(entrystore.iter_n_children(parent)):
-            iter = entrystore.iter_nth_child(parent, i)
-            e = entrystore.get_entry(iter)
+    def export_stream(self, entrystore, parent = None):
+        "Serializes data into a stream of XML fragments"
 
-            xml += "\n"
-            xml += tabs + "<entry type=\"%s\">\n" % e.id
-            xml += tabs + " <name>%s</name>\n" % util.escape_markup(e.name)
-            xml += tabs + " <description>%s</description>\n" % util.escape_markup(e.description)
-            xml += tabs + " <updated>%d</updated>\n" % e.updated
-            xml += tabs + " <notes>%s</notes>\n" % util.escape_markup(e.notes)
+        yield "<?xml version=\"1.0\" encoding=\"utf-8\" ?>\n"
+        yield "<revelationdata version=\"%s\" dataversion=\"1\">\n" % config.VERSION
 
-            for field in e.fields:
-                xml += tabs + " <field id=\"%s\">%s</field>\n" % (field.id, util.escape_markup(field.value))
+        # walk the tree depth-first, with the next iter of each open level on a stack
+        stack = [entrystore.iter_children(parent)]
 
-            xml += RevelationXML.export_data(self, entrystore, password, iter, level + 1)
-            xml += tabs + "</entry>\n"
+        while len(stack) > 0:
+            iter = stack[-1]
 
-        if level == 0:
-            header = "<?xml version=\"1.0\" encoding=\"utf-8\" ?>\n"
-            header += "<revelationdata version=\"%s\" dataversion=\"1\">\n" % config.VERSION
-            footer = "</revelationdata>\n"
+            # close the parent once all of its children are done
+            if iter is None:
+                stack.pop()
 
-            xml = header + xml + footer
+                if len(stack) > 0:
+                    yield "\t" * len(stack) + "</entry>\n"
 
-        return xml
+                continue
+
+            e = entrystore.get_entry(iter)
+            tabs = "\t" * len(stack)
+
+            xml = [
+                "\n",
+                tabs + "<entry type=\"%s\">\n" % e.id,
+                tabs + " <name>%s</name>\n" % util.escape_markup(e.name),
+                tabs + " <description>%s</description>\n" % util.escape_markup(e.description),
+                tabs + " <updated>%d</updated>\n" % e.updated,
+                tabs + " <notes>%s</notes>\n" % util.escape_markup(e.notes)
+            ]
+
+            for fieldtype, value in zip(e.fieldtypes, e.values):
+                xml.append(tabs + " <field id=\"%s\">%s</field>\n" % (fieldtype.id, util.escape_markup(value)))
+
+            yield "".join(xml)
+
+            stack[-1] = entrystore.iter_next(iter)
+            stack.append(entrystore.iter_children(iter))
+
+        yield "</revelationdata>\n"
 
     def import_data(self, input, password = None):
         "Imports data from a data stream to an entrystore"
 
         RevelationXML.check(self, input)
 
-        try:
-            dom = defusedxml.minidom.parseString(input.strip())
+        return self.__xml_import([input.strip()])
 
-        except ExpatError:
-            raise base.FormatError
+    def import_stream(self, stream):
+        "Imports data from an iterable of byte strings to an entrystore"
 
-        if dom.documentElement.nodeName != "revelationdata":
-            raise base.FormatError
+        stream = iter(stream)
+        head = b""
 
-        if "dataversion" not in dom.documentElement.attributes:
-            raise base.FormatError
+        # fetch enough data to check the document header
+        for piece in stream:
+            head += piece
 
-        entrystore = data.EntryStore()
+            if re.search(b"<revelationdata[^>]*>", head) is not None:
+                break
 
-        for node in dom.documentElement.childNodes:
-            self.__xml_import_node(entrystore, node)
+        RevelationXML.check(self, head.lstrip())
 
-        return entrystore
+        return self.__xml_import(itertools.chain([head.lstrip()], stream))
 
 
 class Revelation(RevelationXML):
@@ -434,12 +431,8 @@ class Revelation2(RevelationXML):
         except (base.FormatError, base.VersionError):
             return False
 
-    def export_data(self, entrystore, password):
-        "Exports data from an entrystore"
-
-        # check and hash password with a salt
-        if password is None:
-            raise base.PasswordError
+    def derive_key(self, password):
+        "Derives a key for a new file, returns it with its salt"
 
         # 64-bit salt
         salt = get_random_bytes(8)
@@ -447,6 +440,18 @@ class Revelation2(RevelationXML):
         # 256-bit key
         key = PBKDF2(password, salt, 32, count=12000, hmac_hash_module=SHA1)
 
+        return salt, key
+
+    def export_data(self, entrystore, password, keydata = None):
+        "Exports data from an entrystore"
+
+        # check and hash password with a salt
+        if password is None:
+            raise base.PasswordError
+
+        # derive a key, unless one has been derived in advance
+        salt, key = keydata or self.derive_key(password)
+
         # generate XML
         data = RevelationXML.export_data(self, entrystore)
 
@@ -518,3 +523,690 @@ class Revelation2(RevelationXML):
         entrystore = RevelationXML.import_data(self, data)
 
         return entrystore
+
+
+class Revelation3(RevelationXML):
+    "Handler for Revelation data version 3"
+
+    name        = "Revelation3"
+    importer    = True
+    exporter    = True
+    encryption  = True
+    journal     = True
+
+    def __init__(self):
+        RevelationXML.__init__(self)
+
+        self.kdf = KDF()
+        self.threads = 0
+
+        # header and key of the last file read or written, used for its journal
+        self.__session = None
+
+    def __compress(self, fragments, pool, window):
+        "Compresses a stream of text fragments, deflating blocks of it in parallel"
+
+        checksum = 1
+
+        def blocks():
+            nonlocal checksum
+
+            previous = b""
+
+            for block in self.__join_fragments(fragments, BLOCKSIZE):
+                checksum = zlib.adler32(block, checksum)
+
+                yield block, previous
+
+                previous = block[-32 * 1024:]
+
+        # the blocks make up a single zlib stream, which any zlib
+        # implementation can decompress as if it was written in one go
+        yield b"\x78\x9c"       # zlib header, 32k window and default compression
+
+        for data in self.__map(pool, window, self.__deflate_block, blocks()):
+            yield data
+
+        yield zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15).flush()
+        yield struct.pack(">I", checksum)
+
+    def __decrypt_chunk(self, chunk, key, header, index, last):
+        "Decrypts and verifies a chunk"
+
+        if len(chunk) < 16:
+            raise base.FormatError
+
+        cipher = AES.new(key, AES.MODE_GCM, nonce = header[28:35] + struct.pack(">I?", index, last))
+        cipher.update(header)
+
+        try:
+            return cipher.decrypt_and_verify(chunk[:-16], chunk[-16:])
+
+        # a bad first chunk means a wrong password, later ones corrupt data
+        except ValueError:
+            raise index == 0 and base.PasswordError or base.FormatError
+
+    def __decrypt_chunks(self, input, key, header, chunksize, pool, window):
+        "Decrypts and verifies the chunks of a data stream, in parallel"
+
+        input = memoryview(input)[len(header):]
+
+        def chunks():
+            offset, index = 0, 0
+
+            while True:
+                chunk = input[offset:offset + chunksize + 16]
+                offset += len(chunk)
+                last = offset == len(input)
+
+                yield chunk, key, header, index, last
+
+                if last:
+                    break
+
+                index += 1
+
+        return self.__map(pool, window, self.__decrypt_chunk, chunks())
+
+    def __decompress(self, chunks):
+        "Decompresses a stream of data chunks"
+
+        decompressor = zlib.decompressobj()
+
+        try:
+            for chunk in chunks:
+                yield decompressor.decompress(chunk)
+
+            yield decompressor.flush()
+
+        except zlib.error:
+            raise base.FormatError
+
+        if not decompressor.eof or decompressor.unused_data != b"":
+            raise base.FormatError
+
+    def __deflate_block(self, block, previous):
+        "Deflates a block, using the previous block as dictionary, and flushes it to a byte boundary"
+
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15, zdict = previous)
+
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def __encrypt_chunk(self, chunk, key, header, index, last):
+        "Encrypts and authenticates a chunk"
+
+        cipher = AES.new(key, AES.MODE_GCM, nonce = header[28:35] + struct.pack(">I?", index, last))
+        cipher.update(header)
+
+        return b"".join(cipher.encrypt_and_digest(chunk))
+
+    def __encrypt_chunks(self, stream, key, header, chunksize, pool, window):
+        "Splits a data stream into chunks, and encrypts and authenticates them in parallel"
+
+        def chunks():
+            buffer = b""
+            index = 0
+
+            for data in stream:
+                buffer += data
+
+                # a chunk is only complete when more data follows, since the last one is marked
+                while len(buffer) > chunksize:
+                    yield buffer[:chunksize], key, header, index, False
+
+                    buffer = buffer[chunksize:]
+                    index += 1
+
+            yield buffer, key, header, index, True
+
+        return self.__map(pool, window, self.__encrypt_chunk, chunks())
+
+    def __generate_header(self, kdf, salt, nonce, chunksize):
+        "Generates a header"
+
+        header = b"rvl\x00"        # magic string
+        header += b"\x03"           # data version
+        header += b"\x00"           # separator
+        header += b"\x00\x05\x06"   # application version
+        header += b"\x00\x00\x00"   # separator
+        header += salt              # 128-bit salt
+        header += nonce             # 56-bit nonce prefix
+        header += struct.pack(">I", chunksize)
+        header += b"\x00"           # flags, reserved
+        header += kdf.pack()        # key derivation function and parameters
+
+        return header
+
+    def __join_fragments(self, fragments, size):
+        "Joins text fragments into encoded blocks of at least the given size"
+
+        buffer, length = [], 0
+
+        for fragment in fragments:
+            buffer.append(fragment.encode())
+            length += len(buffer[-1])
+
+            if length >= size:
+                yield b"".join(buffer)
+
+                buffer, length = [], 0
+
+        if length > 0:
+            yield b"".join(buffer)
+
+    def __journal_decode_change(self, data):
+        "Decodes a journaled change"
+
+        try:
+            change = json.loads(data.decode())
+
+            if change[0] not in ("add", "addmany", "move", "update", "remove"):
+                raise base.FormatError
+
+            for i, item in enumerate(change):
+                if isinstance(item, dict):
+                    change[i] = self.__journal_decode_entry(item)
+
+            # bulk additions carry entries with the positions of their parents
+            if change[0] == "addmany":
+                entries = []
+
+                for parentref, item in change[3]:
+                    if parentref is not None and (type(parentref) != int or not 0 <= parentref < len(entries)):
+                        raise base.FormatError
+
+                    entries.append((parentref, self.__journal_decode_entry(item)))
+
+                change[3] = entries
+
+            # moves carry the paths of all the entries they move
+            elif change[0] == "move" and not all(type(index) == int for path in change[1] for index in path):
+                raise base.FormatError
+
+            return tuple(change)
+
+        except (AttributeError, ValueError, TypeError, IndexError, KeyError):
+            raise base.FormatError
+
+    def __journal_decode_entry(self, data):
+        "Decodes a journaled entry"
+
+        if data["type"] not in entry.ENTRYMAP:
+            raise base.DataError
+
+        e = entry.ENTRYMAP[data["type"]]()
+        e.name          = data["name"]
+        e.description   = data["description"]
+        e.notes         = data["notes"]
+        e.updated       = int(data["updated"])
+
+        for fieldid, value in data["fields"].items():
+            fieldtype = entry.FIELDMAP.get(fieldid)
+
+            if fieldtype is not None and e.has_field(fieldtype):
+                e[fieldtype] = value
+
+        return e
+
+    def __journal_encode_change(self, change):
+        "Encodes a logged change"
+
+        change = [isinstance(item, (entry.Entry, entry.PackedEntry)) and self.__journal_encode_entry(item) or item for item in change]
+
+        if change[0] == "addmany":
+            change[3] = [(parentref, self.__journal_encode_entry(e)) for parentref, e in change[3]]
+
+        return json.dumps(change).encode()
+
+    def __journal_encode_entry(self, e):
+        "Encodes an entry for the journal"
+
+        if isinstance(e, entry.PackedEntry):
+            e = e.copy()
+
+        return {
+            "type":         e.id,
+            "name":         e.name,
+            "description":  e.description,
+            "notes":        e.notes,
+            "updated":      e.updated,
+            "fields":       dict((fieldtype.id, value) for fieldtype, value in zip(e.fieldtypes, e.values))
+        }
+
+    def __journal_header(self):
+        "Generates a journal header, bound to the current data file"
+
+        header = b"rvlj"            # magic string
+        header += b"\x02"           # journal version, paths follow the locale independent order
+        header += b"\x00\x00\x00"   # separator
+        header += SHA256.new(self.__session[0]).digest()
+
+        return header
+
+    def __journal_key(self):
+        "Derives the journal key from the data file key"
+
+        return HMAC.new(self.__session[1], b"revelation journal", SHA256).digest()
+
+    def __map(self, pool, window, function, arguments):
+        "Calls a function for each set of arguments on a thread pool, yielding the results in order"
+
+        # only a window of calls is queued ahead, so memory use stays bounded
+        pending = collections.deque()
+
+        for args in arguments:
+            pending.append(pool.submit(function, *args))
+
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+    def __parse_header(self, header):
+        "Parses a data header, returns the data version"
+
+        if header is None:
+            raise base.FormatError
+
+        match = re.match(b"""
+            ^               # start of header
+            rvl\x00         # magic string
+            (.)             # data version
+            \x00            # separator
+            (.{3})          # app version
+            \x00\x00\x00    # separator
+        """, header, re.VERBOSE | re.DOTALL)
+
+        if match is None:
+            raise base.FormatError
+
+        return ord(match.group(1))
+
+    def __pool(self):
+        "Creates a thread pool for compression and encryption, returns it with its queue length"
+
+        threads = self.threads or os.cpu_count() or 1
+
+        return concurrent.futures.ThreadPoolExecutor(max_workers = threads), threads * 2
+
+    def check(self, input):
+        "Checks if the data is valid"
+
+        if input is None:
+            raise base.FormatError
+
+        if len(input) < (49 + 16):
+            raise base.FormatError
+
+        dataversion = self.__parse_header(input[:12])
+
+        if dataversion != 3:
+            raise base.VersionError
+
+        if input[39:40] != b"\x00":
+            raise base.VersionError
+
+    def detect(self, input):
+        "Checks if the handler can guarantee to use the data"
+
+        try:
+            self.check(input)
+            return True
+
+        except (base.FormatError, base.VersionError):
+            return False
+
+    def derive_key(self, password):
+        "Derives a key for a new file, returns it with its parameters and salt"
+
+        # 128-bit salt, 256-bit key
+        kdf = self.kdf
+        salt = get_random_bytes(16)
+
+        return kdf, salt, kdf.derive(password, salt)
+
+    def export_changes(self, changes, index = 0):
+        "Encrypts logged changes as journal records, with a header for the first"
+
+        if self.__session is None:
+            raise base.PasswordError
+
+        key = self.__journal_key()
+        header = self.__journal_header()
+        records = index == 0 and [header] or []
+
+        # each record is authenticated along with its position in the journal
+        for index, change in enumerate(changes, index):
+            nonce = get_random_bytes(12)
+            cipher = AES.new(key, AES.MODE_GCM, nonce = nonce)
+            cipher.update(header + struct.pack(">I", index))
+            ciphertext, tag = cipher.encrypt_and_digest(self.__journal_encode_change(change))
+
+            records.append(nonce + struct.pack(">I", len(ciphertext)) + ciphertext + tag)
+
+        return b"".join(records)
+
+    def export_data(self, entrystore, password, keydata = None):
+        "Exports data from an entrystore"
+
+        if password is None:
+            raise base.PasswordError
+
+        # derive a key, unless one has been derived in advance
+        kdf, salt, key = keydata or self.derive_key(password)
+
+        # the nonce prefix is unique per file, and the header is
+        # authenticated as part of every chunk
+        header = self.__generate_header(kdf, salt, get_random_bytes(7), CHUNKSIZE)
+
+        # serialize the data as a stream, while blocks of it are
+        # compressed and encrypted by a pool of threads
+        pool, window = self.__pool()
+
+        with pool:
+            stream = self.__compress(RevelationXML.export_stream(self, entrystore), pool, window)
+            chunks = self.__encrypt_chunks(stream, key, header, CHUNKSIZE, pool, window)
+
+            data = header + b"".join(chunks)
+
+        self.__session = (header, key)
+
+        return data
+
+    def import_changes(self, input):
+        "Decrypts a journal, returns the changes and the length of the valid part"
+
+        if self.__session is None:
+            raise base.PasswordError
+
+        key = self.__journal_key()
+        header = self.__journal_header()
+
+        # journals of other data files, or earlier saves, are stale
+        if input[:len(header)] != header:
+            return [], 0
+
+        changes = []
+        offset = len(header)
+
+        # stop at the first damaged record, like one cut short by a crash
+        while offset + 16 + 16 <= len(input):
+            nonce = input[offset:offset + 12]
+            length = struct.unpack(">I", input[offset + 12:offset + 16])[0]
+            end = offset + 16 + length + 16
+
+            if end > len(input):
+                break
+
+            cipher = AES.new(key, AES.MODE_GCM, nonce = nonce)
+            cipher.update(header + struct.pack(">I", len(changes)))
+
+            try:
+                plaintext = cipher.decrypt_and_verify(input[offset + 16:end - 16], input[end - 16:end])
+                changes.append(self.__journal_decode_change(plaintext))
+
+            except (ValueError, base.Error, entry.EntryFieldError):
+                break
+
+            offset = end
+
+        return changes, offset
+
+    def import_data(self, input, password):
+        "Imports data into an entrystore"
+
+        if password is None:
+            raise base.PasswordError
+
+        # check the data
+        self.check(input)
+
+        header = bytes(input[:49])
+        salt = header[12:28]
+        chunksize = struct.unpack(">I", header[35:39])[0]
+
+        if chunksize == 0:
+            raise base.FormatError
+
+        # the key derivation parameters are read from the file, so files
+        # written with other settings can still be opened
+        kdf = KDF(*struct.unpack(">BIHH", header[40:49]))
+        kdf.check()
+
+        key = kdf.derive(password, salt)
+
+        # decrypt and verify chunks in parallel, while decompressing and parsing them
+        pool, window = self.__pool()
+
+        with pool:
+            chunks = self.__decrypt_chunks(input, key, header, chunksize, pool, window)
+            entrystore = RevelationXML.import_stream(self, self.__decompress(chunks))
+
+        self.__session = (header, key)
+
+        return entrystore
+
+
+class KDF(object):
+    "Key derivation function parameters, blocksize and parallelism only apply to scrypt"
+
+    def __init__(self, algorithm = KDF_PBKDF2_SHA256, cost = KDF_MINROUNDS, blocksize = 8, parallel = 1):
+        self.algorithm  = algorithm
+        self.cost       = cost
+        self.blocksize  = blocksize
+        self.parallel   = parallel
+
+    def check(self):
+        "Checks if the parameters are supported and within sane bounds"
+
+        if self.algorithm in (KDF_PBKDF2_SHA1, KDF_PBKDF2_SHA256):
+            if not 0 < self.cost <= KDF_MAXROUNDS:
+                raise base.FormatError
+
+        elif self.algorithm == KDF_SCRYPT:
+            if self.cost < 2 or self.cost & (self.cost - 1) != 0:
+                raise base.FormatError
+
+            if not 0 < self.parallel <= 16 or self.blocksize == 0:
+                raise base.FormatError
+
+            if 128 * self.cost * self.blocksize > KDF_MAXMEMORY:
+                raise base.FormatError
+
+        else:
+            raise base.VersionError
+
+    def check_strength(self):
+        "Checks if the parameters are valid, and costly enough to write files with"
+
+        self.check()
+
+        if self.cost < (self.algorithm == KDF_SCRYPT and KDF_MINSCRYPT or KDF_MINROUNDS):
+            raise base.DataError
+
+    def derive(self, password, salt, length = 32):
+        "Derives a key from a password"
+
+        if self.algorithm == KDF_PBKDF2_SHA1:
+            return PBKDF2(password, salt, length, count=self.cost, hmac_hash_module=SHA1)
+
+        elif self.algorithm == KDF_PBKDF2_SHA256:
+            return PBKDF2(password, salt, length, count=self.cost, hmac_hash_module=SHA256)
+
+        elif self.algorithm == KDF_SCRYPT:
+            return scrypt(password, salt, length, self.cost, self.blocksize, self.parallel)
+
+        else:
+            raise base.VersionError
+
+    def pack(self):
+        "Packs the parameters for a file header"
+
+        return struct.pack(">BIHH", self.algorithm, self.cost, self.blocksize, self.parallel)
+
+
+def calibrate_kdf(algorithm = KDF_PBKDF2_SHA256, target = 0.25):
+    "Picks KDF parameters which take about target seconds on this machine"
+
+    if algorithm == KDF_SCRYPT:
+        kdf = KDF(KDF_SCRYPT, KDF_MINSCRYPT)
+
+    else:
+        kdf = KDF(algorithm, 10000)
+
+    kdf.check()
+
+    start = time.perf_counter()
+    kdf.derive("", get_random_bytes(16))
+    elapsed = max(time.perf_counter() - start, 0.000001)
+
+    # scrypt costs are powers of two, keep the memory use well below
+    # what is accepted when reading files
+    if algorithm == KDF_SCRYPT:
+        while elapsed * 2 <= target and 128 * kdf.cost * 2 * kdf.blocksize <= KDF_MAXMEMORY // 4:
+            kdf.cost    *= 2
+            elapsed     *= 2
+
+    # pbkdf2 time is linear in the number of rounds
+    else:
+        rounds = int(kdf.cost * target / elapsed)
+        kdf.cost = min(max(rounds, KDF_MINROUNDS), KDF_MAXROUNDS)
+
+    return kdf
+
+
+class XMLImportTarget(object):
+    "Builds an entrystore of packed entries from XML parser events, as each element closes"
+
+    def __init__(self, lookup_entry, lookup_field):
+        self.entrystore     = store.EntryStore()
+        self.lookup_entry   = lookup_entry
+        self.lookup_field   = lookup_field
+
+        # entries to add once the document is done, as ( parent position, entry )
+        self.entries        = []
+
+        # open elements, as [ tag, attributes, entry, position, text ]
+        self.stack          = []
+
+    def __start_entry(self, attrib, parent):
+        "Reserves a position for an entry, for an opening entry tag"
+
+        entrytype = self.lookup_entry(attrib["type"])
+
+        position = len(self.entries)
+        self.entries.append((parent, None))
+
+        # values are collected until the entry closes, and then packed
+        values = {
+            "entrytype":    entrytype,
+            "name":         "",
+            "description":  "",
+            "notes":        "",
+            "updated":      int(time.time()),
+            "fields":       []
+        }
+
+        self.stack.append(["entry", attrib, values, position, None])
+
+    def close(self):
+        "Returns the entrystore once the document is done"
+
+        self.entrystore.add_entries(self.entries)
+
+        return self.entrystore
+
+    def comment(self, text):
+        "Handles comments, which are only allowed inside entries"
+
+        if len(self.stack) == 1:
+            raise base.FormatError
+
+    def data(self, text):
+        "Collects text for value elements"
+
+        if len(self.stack) > 0 and self.stack[-1][4] is not None:
+            self.stack[-1][4].append(text)
+
+    def end(self, tag):
+        "Handles a closing tag"
+
+        try:
+            tag, attrib, e, position, text = self.stack.pop()
+
+            if tag == "entry":
+                self.entries[position] = (self.entries[position][0], entry.PackedEntry(**e))
+                return
+
+            # only direct children of entries carry values
+            elif text is None:
+                return
+
+            e, text = self.stack[-1][2], "".join(text)
+
+            if tag in ("name", "notes", "description"):
+                e[tag] = text
+
+            elif tag == "updated":
+                e["updated"] = int(text)
+
+            elif tag == "field":
+                fieldtype = self.lookup_field(attrib["id"])
+
+                if fieldtype not in e["entrytype"].fieldindex:
+                    raise entry.EntryFieldError
+
+                e["fields"].append((fieldtype, text))
+
+        except (entry.EntryTypeError, entry.EntryFieldError):
+            raise base.DataError
+
+        except KeyError:
+            raise base.FormatError
+
+        except ValueError:
+            raise base.DataError
+
+    def pi(self, target, text):
+        "Handles processing instructions, which are only allowed inside entries"
+
+        self.comment(text)
+
+    def start(self, tag, attrib):
+        "Handles an opening tag"
+
+        try:
+            if len(self.stack) == 0:
+                if tag != "revelationdata" or "dataversion" not in attrib:
+                    raise base.FormatError
+
+                self.stack.append([tag, attrib, None, None, None])
+
+            elif self.stack[-1][0] == "revelationdata":
+                if tag != "entry":
+                    raise base.FormatError
+
+                self.__start_entry(attrib, None)
+
+            # elements within values are skipped, along with their text
+            elif self.stack[-1][0] != "entry":
+                self.stack.append([tag, attrib, None, None, None])
+
+            elif tag == "entry":
+                if self.stack[-1][2]["entrytype"] != entry.FolderEntry:
+                    raise base.DataError
+
+                self.__start_entry(attrib, self.stack[-1][3])
+
+            elif tag in ("name", "notes", "description", "updated", "field"):
+                self.stack.append([tag, attrib, None, None, []])
+
+            else:
+                raise base.FormatError
+
+        except (entry.EntryTypeError, entry.EntryFieldError):
+            raise base.DataError
+
+        except KeyError:
+            raise base.FormatError
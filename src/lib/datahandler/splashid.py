@@ -26,7 +26,7 @@ import csv
 import time
 
 from . import base
-from revelation import data, entry
+from revelation import entry, store
 
 
 class SplashIDCSV(base.DataHandler):
@@ -68,7 +68,7 @@ class SplashIDCSV(base.DataHandler):
         if input.count(b'\x0b'):
             input = input.replace(b'\x0b', b' ')
 
-        entrystore = data.EntryStore()
+        entries = []
 
         # Maintain a hash of folder names to folder entries so we
         # can use each category encountered to create a new folder
@@ -100,10 +100,14 @@ class SplashIDCSV(base.DataHandler):
                 else:
                     folder      = entry.FolderEntry()
                     folder.name = category
-                    parent      = entrystore.add_entry(new_folder)
+                    parent      = len(entries)
                     folders[row[8]] = parent
+                    entries.append((None, new_folder))
 
                 # Add the entry
-                entrystore.add_entry(e, parent)
+                entries.append((parent, e))
+
+        entrystore = store.EntryStore()
+        entrystore.add_entries(entries)
 
         return entrystore
@@ -310,8 +310,9 @@ class XHTML(base.DataHandler):
         tabs = "\t" * (depth + 2)
         e = entrystore.get_entry(iter)
 
+        # entries from the store are read-only, so the id is kept apart
         if e is not None:
-            e.path = self.__get_entryid(entrystore, iter)
+            path = self.__get_entryid(entrystore, iter)
 
         xhtml = ""
 
@@ -328,7 +329,7 @@ class XHTML(base.DataHandler):
             xhtml += "</div>\n"
 
         elif type(e) == entry.FolderEntry:
-            xhtml += tabs + "<li class=\"folder\" id=\"%s\">\n" % e.path
+            xhtml += tabs + "<li class=\"folder\" id=\"%s\">\n" % path
             xhtml += tabs + "   <div class=\"folder-data\">\n"
             xhtml += tabs + "       <h2>%s</h2>\n" % e.name
 
@@ -349,7 +350,7 @@ class XHTML(base.DataHandler):
 
         else:
 
-            xhtml += tabs + "<li class=\"account\" id=\"%s\">\n" % e.path
+            xhtml += tabs + "<li class=\"account\" id=\"%s\">\n" % path
             xhtml += tabs + "   <div class=\"heading\">\n"
             xhtml += tabs + "       <img src=\"%s/entry/%s.png\" alt=\"%s\" />\n" % (IMAGEPATH, e.id, e.typename)
             xhtml += tabs + "       <h2>%s</h2>\n" % e.name
@@ -436,13 +437,12 @@ class XHTML(base.DataHandler):
 
         while iter is not None:
             e = entrystore.get_entry(iter)
-            e.path = self.__get_entryid(entrystore, iter)
 
             if type(e) != entry.FolderEntry:
                 if type(e) not in entries:
                     entries[type(e)] = []
 
-                entries[type(e)].append(e)
+                entries[type(e)].append((self.__get_entryid(entrystore, iter), e))
 
             iter = entrystore.iter_traverse_next(iter)
 
@@ -461,8 +461,8 @@ class XHTML(base.DataHandler):
 
             entrylist = entries[entrytype]
 
-            for e in entrylist:
-                xhtml += "      <li><a href=\"#%s\">%s</a></li>\n" % (str(e.path), e.name)
+            for path, e in entrylist:
+                xhtml += "      <li><a href=\"#%s\">%s</a></li>\n" % (str(path), e.name)
 
             xhtml += "  </ul>\n"
             xhtml += "\n"
@@ -499,27 +499,25 @@ class XHTML(base.DataHandler):
         for i in range(entrystore.iter_n_children(parent)):
             iter = entrystore.iter_nth_child(parent, i)
             e = entrystore.get_entry(iter)
-            e.path = self.__get_entryid(entrystore, iter)
-            e.iter = iter
 
             if type(e) == entry.FolderEntry:
-                folders.append(e)
+                folders.append((iter, self.__get_entryid(entrystore, iter), e))
 
         # generate xhtml
         if len(folders) > 0:
             xhtml += tabs + "<ul>\n"
 
-            for e in folders:
-                childxhtml = self.__generate_sidebar_foldertree(entrystore, e.iter, depth + 1)
+            for iter, path, e in folders:
+                childxhtml = self.__generate_sidebar_foldertree(entrystore, iter, depth + 1)
 
                 if childxhtml != "":
                     xhtml += tabs + "   <li>\n"
-                    xhtml += tabs + "       <a href=\"#%s\">%s</a>\n" % (str(e.path), e.name)
+                    xhtml += tabs + "       <a href=\"#%s\">%s</a>\n" % (str(path), e.name)
                     xhtml += childxhtml
                     xhtml += tabs + "   </li>\n"
 
                 else:
-                    xhtml += tabs + "   <li><a href=\"#%s\">%s</a></li>\n" % (str(e.path), e.name)
+                    xhtml += tabs + "   <li><a href=\"#%s\">%s</a></li>\n" % (str(path), e.name)
 
             xhtml += tabs + "</ul>\n"
 
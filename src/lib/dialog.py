@@ -981,8 +981,8 @@ class EntryEdit(Utility):
 
         self.widgetdata[fieldtype] = userdata
 
-        if fieldtype == entry.UsernameField and entry.UsernameField in self.entry_field:
-            self.entry_field[entry.UsernameField].set_values(userdata)
+        if fieldtype in (entry.UsernameField, entry.EmailField) and fieldtype in self.entry_field:
+            self.entry_field[fieldtype].set_values(userdata)
 
 
 class EntryRemove(Warning):
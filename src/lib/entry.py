@@ -25,9 +25,10 @@
 
 from revelation import ui
 
-import copy
 import gettext
+import json
 import time
+import types
 
 _ = gettext.gettext
 
@@ -44,30 +45,344 @@ class EntryFieldError(Exception):
     pass
 
 
+class EntryFrozenError(Exception):
+    "Exception for changes to read-only entries"
+    pass
+
+
 class EntryTypeError(Exception):
     "Exception for invalid entry types"
     pass
 
 
+class Field(object):
+    "An entry field object, which reads and writes its value in an entry"
+
+    __slots__   = ("entry", "index")
+
+    id      = None
+    name        = ""
+    description = ""
+    symbol      = None
+
+    datatype    = None
+
+    # equal values of non-secret fields may be shared between entries,
+    # secret values are never pooled so they are freed with their entry
+    shared      = False
+
+    def __init__(self, entry, index):
+        self.entry  = entry
+        self.index  = index
+
+    def __str__(self):
+        return self.value is not None and self.value or ""
+
+    @property
+    def value(self):
+        "The value of the field, stored in the entry"
+
+        return self.entry.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.entry[type(self)] = value
+
+
+class CardnumberField(Field):
+
+    __slots__   = ()
+
+    id      = "creditcard-cardnumber"
+    symbol      = "N"
+    datatype    = DATATYPE_STRING
+
+    name        = property(lambda self: _('Card number'))
+    description = property(lambda self: _('The number of a creditcard, usually a 16-digit number'))
+
+
+class CardtypeField(Field):
+
+    __slots__   = ()
+
+    id      = "creditcard-cardtype"
+    symbol      = "C"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Card type'))
+    description = property(lambda self: _('The type of creditcard, like MasterCard or VISA'))
+
+
+class CCVField(Field):
+
+    __slots__   = ()
+
+    id      = "creditcard-ccv"
+    symbol      = "V"
+    datatype    = DATATYPE_STRING
+
+    name        = property(lambda self: _('CCV number'))
+    description = property(lambda self: _('A Credit Card Verification number, normally a 3-digit code found on the back of a card'))
+
+
+class CertificateField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-certificate"
+    symbol      = "x"
+    datatype    = DATATYPE_FILE
+
+    name        = property(lambda self: _('Certificate'))
+    description = property(lambda self: _('A certificate, such as an X.509 SSL Certificate'))
+
+
+class CodeField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-code"
+    symbol      = "c"
+    datatype    = DATATYPE_PASSWORD
+
+    name        = property(lambda self: _('Code'))
+    description = property(lambda self: _('A code used to provide access to something'))
+
+
+class DatabaseField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-database"
+    symbol      = "D"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Database'))
+    description = property(lambda self: _('A database name'))
+
+
+class DomainField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-domain"
+    symbol      = "d"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Domain'))
+    description = property(lambda self: _('An Internet or logon domain, like organization.org or a Windows logon domain'))
+
+
+class EmailField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-email"
+    symbol      = "e"
+    datatype    = DATATYPE_EMAIL
+    shared      = True
+
+    name        = property(lambda self: _('Email'))
+    description = property(lambda self: _('An email address'))
+
+
+class ExpirydateField(Field):
+
+    __slots__   = ()
+
+    id      = "creditcard-expirydate"
+    symbol      = "E"
+    datatype    = DATATYPE_STRING
+
+    name        = property(lambda self: _('Expiry date'))
+    description = property(lambda self: _('The month that the credit card validity expires'))
+
+
+class HostnameField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-hostname"
+    symbol      = "h"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Hostname'))
+    description = property(lambda self: _('The name of a computer, like computer.domain.com or MYCOMPUTER'))
+
+
+class KeyfileField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-keyfile"
+    symbol      = "f"
+    datatype    = DATATYPE_FILE
+    shared      = True
+
+    name        = property(lambda self: _('Key File'))
+    description = property(lambda self: _('A key file, used for authentication for example via ssh or to encrypt X.509 certificates'))
+
+
+class LocationField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-location"
+    symbol      = "L"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Location'))
+    description = property(lambda self: _('A physical location, like office entrance'))
+
+
+class PasswordField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-password"
+    symbol      = "p"
+    datatype    = DATATYPE_PASSWORD
+
+    name        = property(lambda self: _('Password'))
+    description = property(lambda self: _('A secret word or character combination used for proving you have access'))
+
+
+class PhonenumberField(Field):
+
+    __slots__   = ()
+
+    id      = "phone-phonenumber"
+    symbol      = "n"
+    datatype    = DATATYPE_STRING
+
+    name        = property(lambda self: _('Phone number'))
+    description = property(lambda self: _('A telephone number'))
+
+
+class PINField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-pin"
+    symbol      = "P"
+    datatype    = DATATYPE_PASSWORD
+
+    name        = property(lambda self: _('PIN'))
+    description = property(lambda self: _('A Personal Identification Number, a numeric code used for credit cards, phones etc'))
+
+
+class PortField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-port"
+    symbol      = "o"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Port number'))
+    description = property(lambda self: _('A network port number, used to access network services directly'))
+
+
+class URLField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-url"
+    symbol      = "U"
+    datatype    = DATATYPE_URL
+    shared      = True
+
+    name        = property(lambda self: _('URL'))
+    description = property(lambda self: _('A Uniform Resource Locator, such as a web-site address'))
+
+
+class UsernameField(Field):
+
+    __slots__   = ()
+
+    id      = "generic-username"
+    symbol      = "u"
+    datatype    = DATATYPE_STRING
+    shared      = True
+
+    name        = property(lambda self: _('Username'))
+    description = property(lambda self: _('A name or other identification used to identify yourself'))
+
+
+FIELDLIST = [
+    CardnumberField,
+    CardtypeField,
+    CCVField,
+    CertificateField,
+    CodeField,
+    DatabaseField,
+    DomainField,
+    EmailField,
+    ExpirydateField,
+    HostnameField,
+    KeyfileField,
+    LocationField,
+    PasswordField,
+    PhonenumberField,
+    PINField,
+    PortField,
+    URLField,
+    UsernameField
+]
+
+
 class Entry(object):
     "An entry object"
 
+    __slots__   = ("name", "description", "notes", "updated", "values", "frozen")
+
     id      = None
     typename    = ""
     icon        = None
+    fieldtypes  = ()
+    fieldindex  = types.MappingProxyType({})
+    sharedindices   = ()
 
     def __init__(self):
         self.name       = ""
         self.description    = ""
         self.notes      = ""
         self.updated        = int(time.time())
-        self.fields     = []
+        self.values     = [""] * len(self.fieldtypes)
+        self.frozen     = False
 
     def __getitem__(self, key):
-        return self.get_field(key).value
+        return self.values[self.__get_index(key)]
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise EntryFrozenError
+
+        object.__setattr__(self, name, value)
 
     def __setitem__(self, key, value):
-        self.get_field(key).value = value
+        index = self.__get_index(key)
+
+        if self.frozen:
+            raise EntryFrozenError
+
+        self.values[index] = value
+
+    def __get_index(self, fieldtype):
+        "Gets the position of a field in the values of the entry"
+
+        index = self.fieldindex.get(fieldtype)
+
+        if index is None or self.fieldtypes[index] != fieldtype:
+            raise EntryFieldError
+
+        return index
 
     def convert_generic(self):
         "Creates a GenericEntry with the data from this entry"
@@ -79,9 +394,9 @@ class Entry(object):
         generic.updated = self.updated
 
         # do direct field copies
-        for field in generic.fields:
-            if self.has_field(type(field)):
-                field.value = self[type(field)]
+        for fieldtype in generic.fieldtypes:
+            if self.has_field(fieldtype):
+                generic[fieldtype] = self[fieldtype]
 
         # handle special conversions
         if type(self) == CreditcardEntry:
@@ -113,25 +428,43 @@ class Entry(object):
         return generic
 
     def copy(self):
-        "Create a copy of the entry"
+        "Create a modifiable copy of the entry"
+
+        e = object.__new__(type(self))
+        e.name          = self.name
+        e.description   = self.description
+        e.notes         = self.notes
+        e.updated       = self.updated
+        e.values        = list(self.values)
+        e.frozen        = False
+
+        return e
+
+    @property
+    def fields(self):
+        "The fields of the entry, as views of its values"
+
+        return tuple(fieldtype(self, index) for index, fieldtype in enumerate(self.fieldtypes))
+
+    def freeze(self):
+        "Makes the entry read-only, so it can be shared instead of copied"
 
-        return copy.deepcopy(self)
+        if not self.frozen:
+            self.values = tuple(self.values)
+            self.frozen = True
+
+        return self
 
     def get_field(self, fieldtype):
         "Get one of the entries fields"
 
-        for field in self.fields:
-            if type(field) == fieldtype:
-                return field
-
-        else:
-            raise EntryFieldError
+        return fieldtype(self, self.__get_index(fieldtype))
 
     def has_field(self, fieldtype):
         "Check if the entry has a field"
 
         try:
-            self.get_field(fieldtype)
+            self.__get_index(fieldtype)
             return True
 
         except EntryFieldError:
@@ -148,219 +481,247 @@ class Entry(object):
         self.notes      = entry.notes
         self.updated        = entry.updated
 
-        for field in entry.fields:
-            self[type(field)] = field.value
+        for fieldtype, value in zip(entry.fieldtypes, entry.values):
+            self[fieldtype] = value
+
+
+class PackedEntry(object):
+    "An entry kept as a compact string, which is only unpacked when needed"
+
+    __slots__   = ("entrytype", "name", "updated", "data")
+
+    def __init__(self, entrytype, name = "", description = "", notes = "", updated = None, fields = ()):
+        self.entrytype  = entrytype
+        self.name       = name
+        self.updated    = updated
+
+        values = [description, notes]
+
+        for fieldtype, value in fields:
+            values.extend((fieldtype.id, value))
+
+        self.data = json.dumps(values, ensure_ascii = False, separators = (",", ":")).encode("utf-8")
+
+    def copy(self):
+        "Unpacks the entry into a full entry object"
+
+        e = self.entrytype()
+        e.name = self.name
+
+        values = json.loads(self.data.decode("utf-8"))
+        e.description, e.notes = values[0], values[1]
+
+        if self.updated is not None:
+            e.updated = self.updated
+
+        for i in range(2, len(values), 2):
+            e[FIELDMAP[values[i]]] = values[i + 1]
+
+        return e
+
+    @property
+    def icon(self):
+        "The icon of the entry type"
+
+        return self.entrytype.icon
 
 
 class FolderEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "folder"
-        self.typename   = _('Folder')
-        self.icon   = ui.STOCK_ENTRY_FOLDER
-        self.openicon   = ui.STOCK_ENTRY_FOLDER_OPEN
+    id      = "folder"
+    icon        = ui.STOCK_ENTRY_FOLDER
+    openicon    = ui.STOCK_ENTRY_FOLDER_OPEN
+    typename    = property(lambda self: _('Folder'))
 
 
 class CreditcardEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "creditcard"
-        self.typename   = _('Creditcard')
-        self.icon   = ui.STOCK_ENTRY_CREDITCARD
+    id      = "creditcard"
+    icon        = ui.STOCK_ENTRY_CREDITCARD
+    typename    = property(lambda self: _('Creditcard'))
 
-        self.fields = [
-            CardtypeField(),
-            CardnumberField(),
-            ExpirydateField(),
-            CCVField(),
-            PINField()
-        ]
+    fieldtypes  = (
+        CardtypeField,
+        CardnumberField,
+        ExpirydateField,
+        CCVField,
+        PINField
+    )
 
 
 class CryptoKeyEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "cryptokey"
-        self.typename   = _('Crypto Key')
-        self.icon   = ui.STOCK_ENTRY_CRYPTOKEY
+    id      = "cryptokey"
+    icon        = ui.STOCK_ENTRY_CRYPTOKEY
+    typename    = property(lambda self: _('Crypto Key'))
 
-        self.fields = [
-            HostnameField(),
-            CertificateField(),
-            KeyfileField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        CertificateField,
+        KeyfileField,
+        PasswordField
+    )
 
 
 class DatabaseEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "database"
-        self.typename   = _('Database')
-        self.icon   = ui.STOCK_ENTRY_DATABASE
+    id      = "database"
+    icon        = ui.STOCK_ENTRY_DATABASE
+    typename    = property(lambda self: _('Database'))
 
-        self.fields = [
-            HostnameField(),
-            UsernameField(),
-            PasswordField(),
-            DatabaseField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        UsernameField,
+        PasswordField,
+        DatabaseField
+    )
 
 
 class DoorEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "door"
-        self.typename   = _('Door lock')
-        self.icon   = ui.STOCK_ENTRY_DOOR
+    id      = "door"
+    icon        = ui.STOCK_ENTRY_DOOR
+    typename    = property(lambda self: _('Door lock'))
 
-        self.fields = [
-            LocationField(),
-            CodeField()
-        ]
+    fieldtypes  = (
+        LocationField,
+        CodeField
+    )
 
 
 class EmailEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "email"
-        self.typename   = _('Email')
-        self.icon   = ui.STOCK_ENTRY_EMAIL
+    id      = "email"
+    icon        = ui.STOCK_ENTRY_EMAIL
+    typename    = property(lambda self: _('Email'))
 
-        self.fields = [
-            EmailField(),
-            HostnameField(),
-            UsernameField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        EmailField,
+        HostnameField,
+        UsernameField,
+        PasswordField
+    )
 
 
 class FTPEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "ftp"
-        self.typename   = _('FTP')
-        self.icon   = ui.STOCK_ENTRY_FTP
+    id      = "ftp"
+    icon        = ui.STOCK_ENTRY_FTP
+    typename    = property(lambda self: _('FTP'))
 
-        self.fields = [
-            HostnameField(),
-            PortField(),
-            UsernameField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        PortField,
+        UsernameField,
+        PasswordField
+    )
 
 
 class GenericEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "generic"
-        self.typename   = _('Generic')
-        self.icon   = ui.STOCK_ENTRY_GENERIC
+    id      = "generic"
+    icon        = ui.STOCK_ENTRY_GENERIC
+    typename    = property(lambda self: _('Generic'))
 
-        self.fields = [
-            HostnameField(),
-            UsernameField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        UsernameField,
+        PasswordField
+    )
 
 
 class PhoneEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "phone"
-        self.typename   = _('Phone')
-        self.icon   = ui.STOCK_ENTRY_PHONE
+    id      = "phone"
+    icon        = ui.STOCK_ENTRY_PHONE
+    typename    = property(lambda self: _('Phone'))
 
-        self.fields = [
-            PhonenumberField(),
-            PINField()
-        ]
+    fieldtypes  = (
+        PhonenumberField,
+        PINField
+    )
 
 
 class ShellEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "shell"
-        self.typename   = _('Shell')
-        self.icon   = ui.STOCK_ENTRY_SHELL
+    id      = "shell"
+    icon        = ui.STOCK_ENTRY_SHELL
+    typename    = property(lambda self: _('Shell'))
 
-        self.fields = [
-            HostnameField(),
-            DomainField(),
-            UsernameField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        DomainField,
+        UsernameField,
+        PasswordField
+    )
 
 
 class RemoteDesktopEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "remotedesktop"
-        self.typename   = _('Remote Desktop')
-        self.icon   = ui.STOCK_ENTRY_REMOTEDESKTOP
+    id      = "remotedesktop"
+    icon        = ui.STOCK_ENTRY_REMOTEDESKTOP
+    typename    = property(lambda self: _('Remote Desktop'))
 
-        self.fields = [
-            HostnameField(),
-            PortField(),
-            UsernameField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        PortField,
+        UsernameField,
+        PasswordField
+    )
 
 
 class WebEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "website"
-        self.typename   = _('Website')
-        self.icon   = ui.STOCK_ENTRY_WEBSITE
+    id      = "website"
+    icon        = ui.STOCK_ENTRY_WEBSITE
+    typename    = property(lambda self: _('Website'))
 
-        self.fields = [
-            URLField(),
-            UsernameField(),
-            EmailField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        URLField,
+        UsernameField,
+        EmailField,
+        PasswordField
+    )
 
 
 class VNCEntry(Entry):
 
-    def __init__(self):
-        Entry.__init__(self)
+    __slots__   = ()
 
-        self.id     = "vnc"
-        self.typename   = _('VNC')
-        self.icon   = ui.STOCK_ENTRY_REMOTEDESKTOP
+    id      = "vnc"
+    icon        = ui.STOCK_ENTRY_REMOTEDESKTOP
+    typename    = property(lambda self: _('VNC'))
 
-        self.fields = [
-            HostnameField(),
-            PortField(),
-            UsernameField(),
-            PasswordField()
-        ]
+    fieldtypes  = (
+        HostnameField,
+        PortField,
+        UsernameField,
+        PasswordField
+    )
 
 
 ENTRYLIST = [
@@ -380,239 +741,13 @@ ENTRYLIST = [
 ]
 
 
-class Field(object):
-    "An entry field object"
-
-    id      = None
-    name        = ""
-    description = ""
-    symbol      = None
-
-    datatype    = None
-    value       = None
-
-    def __init__(self, value = ""):
-        self.value = value
-
-    def __str__(self):
-        return self.value is not None and self.value or ""
-
-
-class CardnumberField(Field):
-
-    id      = "creditcard-cardnumber"
-    symbol      = "N"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Card number')
-        self.description    = _('The number of a creditcard, usually a 16-digit number')
-
-
-class CardtypeField(Field):
-
-    id      = "creditcard-cardtype"
-    symbol      = "C"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Card type')
-        self.description    = _('The type of creditcard, like MasterCard or VISA')
-
-
-class CCVField(Field):
-
-    id      = "creditcard-ccv"
-    symbol      = "V"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('CCV number')
-        self.description    = _('A Credit Card Verification number, normally a 3-digit code found on the back of a card')
-
-
-class CertificateField(Field):
-
-    id      = "generic-certificate"
-    symbol      = "x"
-    datatype    = DATATYPE_FILE
-
-    def __init__(self, value = ""):
-        self.name       = _('Certificate')
-        self.description    = _('A certificate, such as an X.509 SSL Certificate')
-
-
-class CodeField(Field):
-
-    id      = "generic-code"
-    symbol      = "c"
-    datatype    = DATATYPE_PASSWORD
-
-    def __init__(self, value = ""):
-        self.name       = _('Code')
-        self.description    = _('A code used to provide access to something')
-
-
-class DatabaseField(Field):
-
-    id      = "generic-database"
-    symbol      = "D"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Database')
-        self.description    = _('A database name')
-
-
-class DomainField(Field):
-
-    id      = "generic-domain"
-    symbol      = "d"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Domain')
-        self.description    = _('An Internet or logon domain, like organization.org or a Windows logon domain')
-
-
-class EmailField(Field):
-
-    id      = "generic-email"
-    symbol      = "e"
-    datatype    = DATATYPE_EMAIL
-
-    def __init__(self, value = ""):
-        self.name       = _('Email')
-        self.description    = _('An email address')
-
-
-class ExpirydateField(Field):
-
-    id      = "creditcard-expirydate"
-    symbol      = "E"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Expiry date')
-        self.description    = _('The month that the credit card validity expires')
-
-
-class HostnameField(Field):
-
-    id      = "generic-hostname"
-    symbol      = "h"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Hostname')
-        self.description    = _('The name of a computer, like computer.domain.com or MYCOMPUTER')
-
-
-class KeyfileField(Field):
-
-    id      = "generic-keyfile"
-    symbol      = "f"
-    datatype    = DATATYPE_FILE
-
-    def __init__(self, value = ""):
-        self.name       = _('Key File')
-        self.description    = _('A key file, used for authentication for example via ssh or to encrypt X.509 certificates')
-
-
-class LocationField(Field):
-
-    id      = "generic-location"
-    symbol      = "L"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Location')
-        self.description    = _('A physical location, like office entrance')
-
+ENTRYMAP = types.MappingProxyType(dict((entrytype.id, entrytype) for entrytype in ENTRYLIST))
+FIELDMAP = types.MappingProxyType(dict((fieldtype.id, fieldtype) for fieldtype in FIELDLIST))
 
-class PasswordField(Field):
-
-    id      = "generic-password"
-    symbol      = "p"
-    datatype    = DATATYPE_PASSWORD
-
-    def __init__(self, value = ""):
-        self.name       = _('Password')
-        self.description    = _('A secret word or character combination used for proving you have access')
-
-
-class PhonenumberField(Field):
-
-    id      = "phone-phonenumber"
-    symbol      = "n"
-    datatype    = DATATYPE_STRING
 
-    def __init__(self, value = ""):
-        self.name       = _('Phone number')
-        self.description    = _('A telephone number')
+# index the field layout of each entry type, for constant-time field lookups
+for entrytype in ENTRYLIST:
+    entrytype.fieldindex = types.MappingProxyType(dict((fieldtype, index) for index, fieldtype in enumerate(entrytype.fieldtypes)))
+    entrytype.sharedindices = tuple(index for index, fieldtype in enumerate(entrytype.fieldtypes) if fieldtype.shared)
 
-
-class PINField(Field):
-
-    id      = "generic-pin"
-    symbol      = "P"
-    datatype    = DATATYPE_PASSWORD
-
-    def __init__(self, value = ""):
-        self.name       = _('PIN')
-        self.description    = _('A Personal Identification Number, a numeric code used for credit cards, phones etc')
-
-
-class PortField(Field):
-
-    id      = "generic-port"
-    symbol      = "o"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Port number')
-        self.description    = _('A network port number, used to access network services directly')
-
-
-class URLField(Field):
-
-    id      = "generic-url"
-    symbol      = "U"
-    datatype    = DATATYPE_URL
-
-    def __init__(self, value = ""):
-        self.name       = _('URL')
-        self.description    = _('A Uniform Resource Locator, such as a web-site address')
-
-
-class UsernameField(Field):
-
-    id      = "generic-username"
-    symbol      = "u"
-    datatype    = DATATYPE_STRING
-
-    def __init__(self, value = ""):
-        self.name       = _('Username')
-        self.description    = _('A name or other identification used to identify yourself')
-
-
-FIELDLIST = [
-    CardnumberField,
-    CardtypeField,
-    CCVField,
-    CertificateField,
-    CodeField,
-    DatabaseField,
-    DomainField,
-    EmailField,
-    ExpirydateField,
-    HostnameField,
-    KeyfileField,
-    LocationField,
-    PasswordField,
-    PhonenumberField,
-    PINField,
-    PortField,
-    URLField,
-    UsernameField
-]
+del entrytype
@@ -42,16 +42,21 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
-from . import datahandler
+from . import datahandler, store
 
 import gettext
 import os.path
 import re
+import threading
 from gi.repository import Gio, GObject, GLib
 
 _ = gettext.gettext
 
 
+# journals larger than this are merged into the data file on the next save
+JOURNALSIZE = 256 * 1024
+
+
 class DataFile(GObject.GObject):
     "Handles data files"
 
@@ -69,6 +74,14 @@ class DataFile(GObject.GObject):
         self.__handler      = None
         self.__password     = None
         self.__monitorhandle    = None
+        self.__keycache     = KeyCache()
+        self.__kdf      = None
+        self.__threads      = None
+        self.__sortorder    = None
+        self.__journalcount = 0
+        self.__journalsize  = None
+        self.__saving       = False
+        self.__savepending  = None
 
         self.set_handler(handler)
 
@@ -104,12 +117,173 @@ class DataFile(GObject.GObject):
             file_monitor_cancel(self.__monitorhandle)
             self.__monitorhandle = None
 
+    def __export(self, handler, entrystore, password):
+        "Exports an entrystore, with a key derived in advance if there is one"
+
+        keydata = self.__keycache.take(handler, password)
+
+        if keydata is not None:
+            return handler.export_data(entrystore, password, keydata)
+
+        else:
+            return handler.export_data(entrystore, password)
+
+    def __journal_replay(self, file, entrystore):
+        "Replays the journal of a file onto its entrystore"
+
+        self.__journalcount, self.__journalsize = 0, 0
+
+        try:
+            journal = file_read(file_journal(file))
+
+        except IOError:
+            return
+
+        changes, length = self.__handler.import_changes(journal)
+        count = entrystore.apply_changes(changes)
+
+        self.__journalcount = count
+
+        # the journal is replaced by the next save, so a copy is kept of one
+        # with changes which could not be restored, and the user told about it
+        if count < len(changes) or 0 < length < len(journal):
+            file_write(file_journal_backup(file), journal)
+            self.emit("journal-damaged", file)
+
+        if count == len(changes) and length == len(journal):
+            self.__journalsize = length
+
+        # a damaged journal is merged into the data file on the next save
+        elif count > 0:
+            self.__journalsize = None
+
+        # and a stale one replaced on the next change
+        else:
+            self.__journalsize = 0
+
+    def __save_done(self, entrystore, file, password, full, count, size, error):
+        "Finishes a background save, and starts the next one if requested"
+
+        if full and file == self.__uri:
+            GLib.idle_add(lambda: self.__monitor(file))
+
+        # a journal of a file saved with a since changed password is unusable
+        if error is None and full and password != self.__password:
+            self.__journalcount, self.__journalsize = 0, None
+
+        elif error is None and full:
+            self.__journalcount, self.__journalsize = 0, 0
+
+            # the save used up the derived key, so derive one for the next
+            self.__keycache.prepare(self.__handler, password)
+
+        elif error is None and self.__journalsize is not None:
+            self.__journalcount += count
+            self.__journalsize  += size
+
+        # retry a failed journal write as a full save, which does not need it
+        elif error is not None and not full:
+            self.__journalsize = None
+            self.save_async(entrystore)
+
+        # the changes of a failed full save were not logged, so only
+        # another full save can store them
+        elif error is not None:
+            self.__journalsize = None
+
+        self.__saving = False
+
+        if error is None:
+            self.emit("save-finished", file)
+
+        elif full:
+            self.emit("save-failed", file)
+
+        self.__save_next()
+
+        return False
+
+    def __save_next(self):
+        "Starts the next requested background save, if any"
+
+        if self.__saving or self.__savepending is None:
+            return False
+
+        entrystore, changes = self.__savepending
+        self.__savepending = None
+
+        file, password, handler = self.__uri, self.__password, self.__handler
+
+        if file is None:
+            return False
+
+        full = changes is None or not handler.journal or self.__journalsize is None or self.__journalsize > JOURNALSIZE
+
+        if not full and len(changes) == 0:
+            return False
+
+        # the entrystore may only be read from the main thread, so
+        # the worker gets a snapshot of it
+        if full:
+            source, count = store.EntrySnapshot(entrystore), 0
+
+        else:
+            source, count = changes, len(changes)
+
+        index = self.__journalcount
+
+        if full:
+            self.__monitor_stop()
+
+        self.__saving = True
+        self.emit("save-started", file)
+
+        def save():
+            output, error = b"", None
+
+            try:
+                if full:
+                    output = self.__export(handler, source, password)
+                    file_write(file, output)
+
+                    if handler.journal:
+                        file_delete(file_journal(file))
+
+                elif index == 0:
+                    output = handler.export_changes(source, index)
+                    file_write(file_journal(file), output)
+
+                else:
+                    output = handler.export_changes(source, index)
+                    file_append(file_journal(file), output)
+
+            # any error must be reported back, or the save never finishes
+            except Exception as e:
+                error = e
+
+            GLib.idle_add(self.__save_done, entrystore, file, password, full, count, len(output), error)
+
+        threading.Thread(target = save, daemon = True).start()
+
+        return False
+
     def close(self):
         "Closes the current file"
 
+        self.save_wait()
         self.set_password(None)
         self.set_file(None)
 
+        self.__journalcount, self.__journalsize = 0, None
+
+    def flush(self, entrystore):
+        "Merges the journal into the data file, if it has any changes"
+
+        if self.__journalcount == 0 or self.__uri is None or self.__password is None:
+            return
+
+        self.save(entrystore, self.__uri, self.__password)
+
     def get_file(self):
         "Gets the current file URI"
 
@@ -142,6 +316,11 @@ class DataFile(GObject.GObject):
 
         return self.__password
 
+    def get_saving(self):
+        "Checks if a save is running, or waiting to run"
+
+        return self.__saving or self.__savepending is not None
+
     def load(self, file_or_uri, password = None, pwgetter = None):
         "Loads a file"
 
@@ -168,6 +347,14 @@ class DataFile(GObject.GObject):
         self.set_password(password)
         self.set_file(file_or_uri)
 
+        # the journal holds paths, which are only valid with the sort order they were logged with
+        if self.__sortorder is not None:
+            entrystore.set_sort_order(*self.__sortorder)
+
+        # apply changes saved since the file itself was last written
+        if self.__handler.journal:
+            self.__journal_replay(file_or_uri, entrystore)
+
         return entrystore
 
     def save(self, entrystore, file, password = None):
@@ -179,15 +366,48 @@ class DataFile(GObject.GObject):
         #   self.__gfile = gfile
         #   self.__monitor(gfile)  # Pass GFile directly
 
+        # finish saves running in the background first, to keep writes in order
+        self.save_wait()
         self.__monitor_stop()
-        file_write(file, self.__handler.export_data(entrystore, password))
+
+        # use the key derived in the background since the last open or save, if any
+        output = self.__export(self.__handler, entrystore, password)
+        file_write(file, output)
 
         # need to use idle_add() to avoid notifying about current save
         GLib.idle_add(lambda: self.__monitor(file))
 
+        # this also derives the key for the next save, since this one used it up
         self.set_password(password)
         self.set_file(file)
 
+        # the data file now contains all journaled changes
+        if self.__handler.journal:
+            file_delete(file_journal(file))
+            self.__journalcount, self.__journalsize = 0, 0
+
+    def save_async(self, entrystore, changes = None):
+        "Saves in the background, logged changes to the journal if given"
+
+        # requests made before a save starts are merged into it
+        if self.__savepending is None:
+            self.__savepending = [entrystore, None if changes is None else list(changes)]
+            GLib.idle_add(self.__save_next)
+
+        elif changes is None:
+            self.__savepending[1] = None
+
+        elif self.__savepending[1] is not None:
+            self.__savepending[1].extend(changes)
+
+    def save_wait(self):
+        "Waits for any background saves to finish"
+
+        context = GLib.MainContext.default()
+
+        while self.get_saving():
+            context.iteration(True)
+
     def set_file(self, file_or_uri):
         "Sets the current file"
 
@@ -229,17 +449,123 @@ class DataFile(GObject.GObject):
 
         self.__handler = handler is not None and handler() or None
 
+        if self.__handler is not None and self.__handler.kdf is not None and self.__kdf is not None:
+            self.__handler.kdf = self.__kdf
+
+        if self.__handler is not None and self.__handler.threads is not None and self.__threads is not None:
+            self.__handler.threads = self.__threads
+
+        self.__keycache.prepare(self.__handler, self.__password)
+
+    def set_kdf(self, kdf):
+        "Sets the key derivation parameters used when saving"
+
+        self.__kdf = kdf
+
+        if kdf is not None and self.__handler is not None and self.__handler.kdf is not None:
+            self.__handler.kdf = kdf
+
+        self.__keycache.prepare(self.__handler, self.__password)
+
     def set_password(self, password):
         "Sets the password for the current file"
 
+        # the journal is encrypted with the old password, so needs merging
+        if password != self.__password:
+            self.__journalsize = None
+
         self.__password = password
 
+        # derive the key for the next save while the user works
+        self.__keycache.prepare(self.__handler, password)
+
+    def set_sort_order(self, casefold = True, natural = False, foldersfirst = False):
+        "Sets the sort order of loaded entrystores, see EntryStore.set_sort_order()"
+
+        self.__sortorder = casefold, natural, foldersfirst
+
+    def set_threads(self, threads):
+        "Sets the number of threads used for compression and encryption, 0 for one per processor"
+
+        self.__threads = threads
+
+        if threads is not None and self.__handler is not None and self.__handler.threads is not None:
+            self.__handler.threads = threads
+
+
+class KeyCache(object):
+    "Derives the encryption key for the next save in a worker thread"
+
+    def __init__(self):
+        self.__lock     = threading.Lock()
+        self.__thread   = None
+        self.__keydata  = None
+        self.__serial   = 0
+
+    def clear(self):
+        "Discards any pending or derived key"
+
+        with self.__lock:
+            self.__serial   += 1
+            self.__thread   = None
+            self.__keydata  = None
+
+    def prepare(self, handler, password):
+        "Starts deriving a key for a handler and password"
+
+        self.clear()
+
+        if handler is None or password is None or not handler.encryption:
+            return
+
+        with self.__lock:
+            serial = self.__serial
+
+        def derive():
+            keydata = handler.derive_key(password)
+
+            # drop the key if it was discarded while being derived
+            with self.__lock:
+                if serial == self.__serial and keydata is not None:
+                    self.__keydata = (handler, password, keydata)
+
+        with self.__lock:
+            self.__thread = threading.Thread(target = derive, daemon = True)
+            self.__thread.start()
+
+    def take(self, handler, password):
+        "Returns a derived key for a handler and password, or None if there is none"
+
+        with self.__lock:
+            thread = self.__thread
+
+        # a key still being derived is still cheaper to wait for than a new one
+        if thread is not None:
+            thread.join()
+
+        with self.__lock:
+            cached, self.__keydata = self.__keydata, None
+            self.__thread = None
+
+        if cached is None or cached[0] is not handler or cached[1] != password:
+            return None
+
+        return cached[2]
+
 
 GObject.type_register(DataFile)
 GObject.signal_new("changed", DataFile, GObject.SignalFlags.ACTION,
                    GObject.TYPE_BOOLEAN, (str,))
 GObject.signal_new("content-changed", DataFile, GObject.SignalFlags.ACTION,
                    GObject.TYPE_BOOLEAN, (str,))
+GObject.signal_new("journal-damaged", DataFile, GObject.SignalFlags.ACTION,
+                   GObject.TYPE_BOOLEAN, (str,))
+GObject.signal_new("save-started", DataFile, GObject.SignalFlags.ACTION,
+                   GObject.TYPE_BOOLEAN, (str,))
+GObject.signal_new("save-finished", DataFile, GObject.SignalFlags.ACTION,
+                   GObject.TYPE_BOOLEAN, (str,))
+GObject.signal_new("save-failed", DataFile, GObject.SignalFlags.ACTION,
+                   GObject.TYPE_BOOLEAN, (str,))
 
 
 def as_gfile(file_or_uri):
@@ -257,6 +583,34 @@ def as_gfile(file_or_uri):
     return Gio.File.new_for_path(file_or_uri)
 
 
+def file_append(file_or_uri, data):
+    "Appends data to a file"
+
+    gfile = as_gfile(file_or_uri)
+    if gfile is None:
+        raise IOError
+
+    try:
+        stream = gfile.append_to(Gio.FileCreateFlags.PRIVATE, None)
+        stream.write_all(data, None)
+        stream.close(None)
+    except GLib.GError:
+        raise IOError
+
+
+def file_delete(file_or_uri):
+    "Deletes a file, if it exists"
+
+    gfile = as_gfile(file_or_uri)
+    if gfile is None:
+        return
+
+    try:
+        gfile.delete(None)
+    except GLib.GError:
+        pass
+
+
 def file_exists(file_or_uri):
     "Checks if a file exists"
 
@@ -275,6 +629,18 @@ def file_is_local(file_or_uri):
     return gfile.get_uri_scheme() == 'file'
 
 
+def file_journal(file_or_uri):
+    "Gets the journal file belonging to a data file"
+
+    return file_or_uri + ".journal"
+
+
+def file_journal_backup(file_or_uri):
+    "Gets the copy kept of a damaged journal belonging to a data file"
+
+    return file_or_uri + ".journal.bak"
+
+
 def file_monitor(file_or_uri, callback):
     "Starts monitoring a file. Returns None if monitoring is not supported (e.g., portal documents)"
 
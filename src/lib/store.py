@@ -0,0 +1,1075 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Module containing the entry tree, independent of any toolkit
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from . import entry, util
+
+import bisect
+import re
+import sys
+import unicodedata
+
+
+COLUMN_NAME  = 0
+COLUMN_ICON  = 1
+COLUMN_ENTRY = 2
+
+NUMBERS = re.compile(r"(\d+)")
+
+
+class EntrySnapshot(object):
+    "A read-only copy of the entries in an entrystore, safe to read from other threads"
+
+    def __init__(self, entrystore):
+        self.__root = SnapshotNode(None, None, 0)
+        self.__copy(entrystore, None, self.__root)
+
+    def __copy(self, entrystore, iter, node):
+        "Copies the children of an iter"
+
+        child = entrystore.iter_children(iter)
+
+        while child is not None:
+            childnode = SnapshotNode(entrystore.get_value(child, COLUMN_ENTRY), node, len(node.children))
+            node.children.append(childnode)
+
+            self.__copy(entrystore, child, childnode)
+            child = entrystore.iter_next(child)
+
+    def get_entry(self, iter):
+        "Fetches a read-only entry"
+
+        if iter is None or iter.entry is None:
+            return None
+
+        if isinstance(iter.entry, entry.PackedEntry):
+            return iter.entry.copy().freeze()
+
+        return iter.entry
+
+    def get_path(self, iter):
+        "Gets a path from an iter"
+
+        path = []
+
+        while iter is not None and iter is not self.__root:
+            path.insert(0, iter.index)
+            iter = iter.parent
+
+        return len(path) > 0 and tuple(path) or None
+
+    def iter_children(self, iter):
+        "Gets the first child of an iter"
+
+        return self.iter_nth_child(iter, 0)
+
+    def iter_n_children(self, iter):
+        "Gets the number of children of an iter"
+
+        return len((iter or self.__root).children)
+
+    def iter_next(self, iter):
+        "Gets the next sibling of an iter"
+
+        return self.iter_nth_child(self.iter_parent(iter), iter.index + 1)
+
+    def iter_nth_child(self, iter, n):
+        "Gets the nth child of an iter"
+
+        children = (iter or self.__root).children
+
+        return n < len(children) and children[n] or None
+
+    def iter_parent(self, iter):
+        "Gets the parent of an iter"
+
+        return iter.parent is not self.__root and iter.parent or None
+
+    def iter_traverse_next(self, iter):
+        "Gets the 'logically next' iter"
+
+        child = self.iter_nth_child(iter, 0)
+
+        if child is not None:
+            return child
+
+        while iter is not None:
+            sibling = self.iter_next(iter)
+
+            if sibling is not None:
+                return sibling
+
+            iter = self.iter_parent(iter)
+
+        return None
+
+
+class EntryStore(object):
+    "A data structure for storing entries, as a tree of nodes sorted by name"
+
+    def __init__(self):
+        self.changed = False
+        self.changelog = None
+        self.valuepool = ValuePool()
+
+        # counts changes to the contents of entries, so results based on them can be checked
+        self.revision = 0
+
+        self.__root     = Node(0, None, 0, None)
+        self.__nodes    = {}
+        self.__nextid   = 1
+        self.__order    = None
+
+        # value counters and indexes are built on the first request for them,
+        # and kept up to date by __index_entry from then on
+        self.__counters = {}
+        self.__searchindex  = None
+        self.__typeindex    = None
+        self.__updatedindex = None
+
+        self.__casefold     = True
+        self.__natural      = False
+        self.__foldersfirst = False
+
+    def __collate(self, text):
+        "Gets the collation key for a piece of text, which sorts accented letters next to their base letters"
+
+        # the journal finds entries by their position, so the order must
+        # be the same in every locale, and not follow the locale collation
+        if text.isascii():
+            return text, text
+
+        base = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+        return base, text
+
+    def __get_children(self, iter):
+        "Gets the child list of an iter, or of the root for None"
+
+        return (iter or self.__root).children or []
+
+    def __get_insertion(self, parent, sibling):
+        "Gets the node to insert an entry below, and the index to insert it at"
+
+        # place after parent if it's not a folder
+        if parent is not None and self.get_entrytype(parent) != entry.FolderEntry:
+            return parent.parent, parent.parent.children.index(parent) + 1
+
+        # place before sibling, if given
+        elif sibling is not None:
+            return sibling.parent, sibling.parent.children.index(sibling)
+
+        # otherwise, append to parent
+        parent = parent or self.__root
+
+        return parent, len(parent.children or ())
+
+    def __get_key(self, iter):
+        "Gets the sort key of a node, which is cached in it until the entry changes"
+
+        name = iter.entry.name.strip()
+
+        if self.__casefold:
+            name = name.casefold()
+
+        # compare numbers by value, keeping text and numbers alternating so they never meet,
+        # and the whole name last so that only names which are equal anyway compare equal
+        if self.__natural:
+            key = tuple(int(part) if i % 2 == 1 else self.__collate(part) for i, part in enumerate(NUMBERS.split(name))), self.__collate(name)
+
+        else:
+            key = self.__collate(name)
+
+        if self.__foldersfirst and self.get_entrytype(iter) != entry.FolderEntry:
+            return 1, key
+
+        return 0, key
+
+    def __get_order(self):
+        "Gets the nodes in pre-order, rebuilding the list if the tree has changed since"
+
+        if self.__order is None:
+            self.__order = []
+            stack = list(reversed(self.__get_children(None)))
+
+            while len(stack) > 0:
+                node = stack.pop()
+                node.position = len(self.__order)
+                self.__order.append(node)
+
+                stack.extend(reversed(node.children or []))
+
+        return self.__order
+
+    def __get_position(self, children, key, index):
+        "Gets the position closest to an index, where a key keeps the children sorted"
+
+        # find the range of positions which keeps the children sorted
+        low, high = 0, len(children)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if children[middle].key < key:
+                low = middle + 1
+
+            else:
+                high = middle
+
+        first, high = low, len(children)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if key < children[middle].key:
+                high = middle
+
+            else:
+                low = middle + 1
+
+        # keep the position if it fits, or move to the nearest fitting one, so
+        # entries appended out of order keep their order among equal ones
+        return min(max(index, first), low)
+
+    def __get_stored(self, e):
+        "Gets the copy of an entry to store"
+
+        # packed and read-only entries are never modified, so they can be shared
+        if isinstance(e, entry.PackedEntry) or e.frozen:
+            return e
+
+        e = e.copy()
+
+        for index in e.sharedindices:
+            e.values[index] = self.valuepool.get(e.values[index])
+
+        return e.freeze()
+
+    def __index_entry(self, node, e, change):
+        "Accounts for an entry being added or removed, in the revision and in the indexes and value counts which are kept"
+
+        self.revision += 1
+
+        # the type and update time are known without unpacking the entry
+        if self.__typeindex is not None:
+            if change > 0:
+                self.__typeindex.setdefault(self.get_entrytype(node), set()).add(node)
+
+            else:
+                self.__typeindex[self.get_entrytype(node)].discard(node)
+
+        if self.__updatedindex is not None:
+            item = (self.get_updated(node), node.id)
+
+            if change > 0:
+                bisect.insort(self.__updatedindex, item)
+
+            else:
+                del self.__updatedindex[bisect.bisect_left(self.__updatedindex, item)]
+
+        # packed entries hold their values as text, outside the pool
+        if not isinstance(e, entry.PackedEntry):
+            for index in e.sharedindices:
+                self.valuepool.count(e.values[index], change)
+
+        if len(self.__counters) == 0 and self.__searchindex is None:
+            return
+
+        if isinstance(e, entry.PackedEntry):
+            e = e.copy()
+
+        for fieldtype, counter in self.__counters.items():
+            if e.has_field(fieldtype):
+                counter.count((e[fieldtype] or "").strip(), change)
+
+        if self.__searchindex is not None:
+            self.__searchindex.index(node, e, change)
+
+    def __insert(self, parent, index, e):
+        "Inserts a node for an entry, as close to an index as the sort order allows, without renumbering its siblings"
+
+        if parent.children is None:
+            parent.children = []
+
+        node = Node(self.__nextid, parent, 0, e)
+        self.__nodes[node.id] = node
+        self.__nextid += 1
+
+        node.key = self.__get_key(node)
+        node.index = self.__get_position(parent.children, node.key, index)
+        parent.children.insert(node.index, node)
+        self.__order = None
+
+        self.__index_entry(node, e, 1)
+
+        return node
+
+    def __log_change(self, *change):
+        "Records a change, if changes are being logged"
+
+        if self.changelog is not None:
+            self.changelog.append(change)
+
+    def __renumber(self, parent, start, end = None):
+        "Updates the indices of a range of children"
+
+        children = parent.children
+
+        for index in range(start, len(children) if end is None else end):
+            children[index].index = index
+
+    def add_entries(self, entries, parent = None, sibling = None):
+        "Adds entries in bulk, from pairs of a parent and an entry, where the parent is None or the position of an earlier pair"
+
+        entries = [(parentref, self.__get_stored(e)) for parentref, e in entries]
+
+        if self.changelog is not None:
+            self.__log_change("addmany", self.get_path(parent), self.get_path(sibling), entries)
+
+        nodes, changed = [], {}
+
+        # entries without a parent are placed like with add_entry, and the
+        # siblings of inserted nodes are renumbered once at the end
+        for parentref, e in entries:
+            if parentref is None:
+                node = self.__insert(*self.__get_insertion(parent, sibling), e)
+
+            else:
+                node = self.__insert(*self.__get_insertion(nodes[parentref], None), e)
+
+            changed[node.parent] = min(changed.get(node.parent, node.index), node.index)
+            nodes.append(node)
+
+        for node, start in changed.items():
+            self.__renumber(node, start)
+
+        self.changed = True
+
+        # report the nodes below existing parents, shallower parents first
+        # since their new nodes change the paths of the deeper ones
+        added = set(nodes)
+        parents = [node for node in changed if node not in added]
+        parents.sort(key = lambda node: len(self.get_path(node)))
+
+        for node in parents:
+            self.nodes_added(node is not self.__root and node or None, [child for child in node.children if child in added])
+
+        return nodes
+
+    def add_entry(self, e, parent = None, sibling = None):
+        "Adds an entry"
+
+        # the positions are logged before inserting, to allow replaying the call
+        if self.changelog is not None:
+            parentpath, siblingpath = self.get_path(parent), self.get_path(sibling)
+
+        node = self.__insert(*self.__get_insertion(parent, sibling), self.__get_stored(e))
+        self.__renumber(node.parent, node.index)
+        self.changed = True
+
+        self.node_added(node)
+
+        if self.changelog is not None:
+            self.__log_change("add", parentpath, siblingpath, node.entry)
+
+        return node
+
+    def apply_changes(self, changes):
+        "Replays logged changes, returns the number of changes applied"
+
+        for count, change in enumerate(changes):
+            if change[0] in ("add", "addmany"):
+                parent, sibling = self.get_iter(change[1]), self.get_iter(change[2])
+
+                # stop at the first change which does not fit the data
+                if (change[1] is not None and parent is None) or (change[2] is not None and sibling is None):
+                    return count
+
+                elif change[0] == "add":
+                    self.add_entry(change[3], parent, sibling)
+
+                else:
+                    self.add_entries(change[3], parent, sibling)
+
+            elif change[0] in ("update", "remove"):
+                iter = self.get_iter(change[1])
+
+                if iter is None:
+                    return count
+
+                elif change[0] == "update":
+                    self.update_entry(iter, change[2])
+
+                else:
+                    self.remove_entry(iter)
+
+            elif change[0] == "move":
+                iters, parent, sibling = [self.get_iter(path) for path in change[1]], self.get_iter(change[2]), self.get_iter(change[3])
+
+                if None in iters or (change[2] is not None and parent is None) or (change[3] is not None and sibling is None):
+                    return count
+
+                self.move_entries(iters, parent, sibling)
+
+            else:
+                return count
+
+        return len(changes)
+
+    def clear(self):
+        "Removes all entries"
+
+        children = self.__get_children(None)
+
+        while len(children) > 0:
+            children.pop()
+            self.node_removed(None, (len(children), ))
+
+        self.__nodes.clear()
+        self.__order = None
+        self.changed = False
+        self.revision += 1
+
+        for fieldtype in self.__counters:
+            self.__counters[fieldtype] = ValueCounter()
+
+        self.__searchindex = None
+        self.__typeindex = None
+        self.__updatedindex = None
+
+        self.valuepool = ValuePool()
+
+    def copy_entry(self, iter, parent = None, sibling = None):
+        "Copies an entry recursively"
+
+        return self.import_entry(self, iter, parent, sibling)
+
+    def filter_parents(self, iters):
+        "Removes all descendants from the list of iters"
+
+        # sorted by path, descendants follow their ancestors directly
+        paths = sorted((self.get_path(iter), index) for index, iter in enumerate(iters))
+        parents, parentpath = set(), None
+
+        for path, index in paths:
+            if parentpath is not None and len(path) > len(parentpath) and path[:len(parentpath)] == parentpath:
+                continue
+
+            parents.add(index)
+            parentpath = path
+
+        return [iter for index, iter in enumerate(iters) if index in parents]
+
+    def folder_expanded(self, iter, expanded):
+        "Sets the expanded state of an entry"
+
+        if iter is None or self.get_entrytype(iter) != entry.FolderEntry:
+            return
+
+        iter.icon = expanded and entry.FolderEntry.openicon or None
+        self.node_changed(iter)
+
+    def get_entry(self, iter):
+        "Fetches a read-only entry, which must be copied before making changes"
+
+        if iter is None or iter.entry is None:
+            return None
+
+        # packed entries are unpacked on each fetch, others are shared
+        if isinstance(iter.entry, entry.PackedEntry):
+            return iter.entry.copy().freeze()
+
+        return iter.entry
+
+    def get_entrytype(self, iter):
+        "Gets the type of the entry in a node, without unpacking it"
+
+        e = iter.entry
+
+        if isinstance(e, entry.PackedEntry):
+            return e.entrytype
+
+        return type(e)
+
+    def get_haystack(self, iter, stripaccents = False):
+        "Gets the searchable values of an entry folded for case-insensitive matching, joined by null characters, and the length of the part with its name, description and notes"
+
+        # the text is kept in the node until the entry changes
+        if iter.haystack is None or iter.haystack[0] != stripaccents:
+            e = self.get_entry(iter)
+            head = "\0".join(util.fold_text(value, stripaccents) for value in (e.name, e.description, e.notes))
+            tail = "".join("\0" + util.fold_text(field.value, stripaccents) for field in e.fields if field.value and field.datatype != entry.DATATYPE_PASSWORD)
+
+            iter.haystack = (stripaccents, head + tail, len(head))
+
+        return iter.haystack[1:]
+
+    def get_iter(self, path):
+        "Gets an iter from a path"
+
+        if not path:
+            return None
+
+        iter = None
+
+        for index in path:
+            children = self.__get_children(iter)
+
+            if not 0 <= index < len(children):
+                return None
+
+            iter = children[index]
+
+        return iter
+
+    def get_node(self, id):
+        "Gets an iter from its node id, which stays the same as long as the node exists"
+
+        return self.__nodes.get(id)
+
+    def get_path(self, iter):
+        "Gets a path from an iter"
+
+        if iter is None:
+            return None
+
+        path = []
+
+        while iter is not self.__root:
+            path.append(iter.index)
+            iter = iter.parent
+
+        return tuple(reversed(path))
+
+    def get_popular_values(self, fieldtype, threshold = 3, limit = None):
+        "Gets the values used at least threshold times for a field type, or the limit most used of them, sorted"
+
+        # each field type gets its own counter
+        if fieldtype not in self.__counters:
+            counter = self.__counters[fieldtype] = ValueCounter()
+
+            for iter in self.__get_order():
+                e = self.get_entry(iter)
+
+                if e.has_field(fieldtype):
+                    counter.count((e[fieldtype] or "").strip(), 1)
+
+        popular = self.__counters[fieldtype].get_common(threshold, limit)
+        popular.sort()
+
+        return popular
+
+    def get_search_candidates(self, string):
+        "Gets the nodes which may contain a string in a searchable value, in pre-order"
+
+        candidates = self.get_text_iters(string)
+
+        if candidates is None:
+            return list(self.__get_order())
+
+        return self.sort_iters(candidates)
+
+    def get_text_iters(self, string):
+        "Gets the set of nodes which may contain a string in a searchable value, or None if the string is too short to tell"
+
+        # building the index unpacks every entry, unlike the type and update indexes
+        if self.__searchindex is None:
+            self.__searchindex = SearchIndex()
+
+            for iter in self.__get_order():
+                self.__searchindex.index(iter, self.get_entry(iter), 1)
+
+        return self.__searchindex.get_candidates(string)
+
+    def get_type_iters(self, entrytype):
+        "Gets the set of nodes holding entries of a type, which must not be modified"
+
+        # the type is read from packed entries without unpacking them
+        if self.__typeindex is None:
+            self.__typeindex = {}
+
+            for iter in self.__get_order():
+                self.__typeindex.setdefault(self.get_entrytype(iter), set()).add(iter)
+
+        return self.__typeindex.get(entrytype, set())
+
+    def get_updated(self, iter):
+        "Gets the time the entry in a node was last updated, without unpacking it"
+
+        return iter.entry.updated or 0
+
+    def get_updated_iters(self, start = None, end = None):
+        "Gets the nodes holding entries last updated from a start time up to an end time, in order of update"
+
+        # the index is a sorted list of ( updated, id ), so a range is found by bisection
+        if self.__updatedindex is None:
+            self.__updatedindex = sorted((self.get_updated(iter), iter.id) for iter in self.__get_order())
+
+        low = 0 if start is None else bisect.bisect_left(self.__updatedindex, (start, ))
+        high = len(self.__updatedindex) if end is None else bisect.bisect_left(self.__updatedindex, (end, ))
+
+        return [self.__nodes[id] for updated, id in self.__updatedindex[low:high]]
+
+    def get_value(self, iter, column):
+        "Gets a column value for an iter"
+
+        if column == COLUMN_NAME:
+            return iter.entry.name
+
+        elif column == COLUMN_ICON:
+            return iter.icon or iter.entry.icon
+
+        elif column == COLUMN_ENTRY:
+            return iter.entry
+
+    def import_entry(self, source, iter, parent = None, sibling = None):
+        "Recursively copies an entry from a different entrystore"
+
+        entries, stack = [], [(None, iter)]
+
+        if iter is None:
+            stack = [(None, source.iter_nth_child(None, i)) for i in reversed(range(source.iter_n_children(None)))]
+
+        # collect the entries depth-first, with the positions of their parents
+        while len(stack) > 0:
+            parentref, child = stack.pop()
+            entries.append((parentref, source.get_value(child, COLUMN_ENTRY)))
+
+            for i in reversed(range(source.iter_n_children(child))):
+                stack.append((len(entries) - 1, source.iter_nth_child(child, i)))
+
+        newiters = self.add_entries(entries, parent, sibling)
+
+        if iter is not None:
+            return newiters[0]
+
+        return [newiter for (parentref, e), newiter in zip(entries, newiters) if parentref is None]
+
+    def is_ancestor(self, iter, descendant):
+        "Checks if an iter is an ancestor of another one"
+
+        descendant = descendant.parent
+
+        while descendant is not None:
+            if descendant is iter:
+                return True
+
+            descendant = descendant.parent
+
+        return False
+
+    def iter_children(self, iter):
+        "Gets the first child of an iter"
+
+        return self.iter_nth_child(iter, 0)
+
+    def iter_n_children(self, iter):
+        "Gets the number of children of an iter"
+
+        return len(self.__get_children(iter))
+
+    def iter_next(self, iter):
+        "Gets the next sibling of an iter"
+
+        children = iter.parent.children
+
+        return iter.index + 1 < len(children) and children[iter.index + 1] or None
+
+    def iter_nth_child(self, iter, n):
+        "Gets the nth child of an iter"
+
+        children = self.__get_children(iter)
+
+        return 0 <= n < len(children) and children[n] or None
+
+    def iter_parent(self, iter):
+        "Gets the parent of an iter"
+
+        return iter.parent is not self.__root and iter.parent or None
+
+    def iter_traverse_next(self, iter):
+        "Gets the 'logically next' iter"
+
+        order = self.__get_order()
+        position = 0 if iter is None else iter.position + 1
+
+        return order[position] if position < len(order) else None
+
+    def iter_traverse_prev(self, iter):
+        "Gets the 'logically previous' iter"
+
+        order = self.__get_order()
+        position = len(order) - 1 if iter is None else iter.position - 1
+
+        return order[position] if position >= 0 else None
+
+    def move_entries(self, iters, parent = None, sibling = None):
+        "Moves entries along with their children, one after another, keeping their nodes"
+
+        if self.changelog is not None:
+            self.__log_change("move", [self.get_path(iter) for iter in iters], self.get_path(parent), self.get_path(sibling))
+
+        for iter in iters:
+            oldparent, oldpath = iter.parent, self.get_path(iter)
+
+            # the insertion point is found first, since the sibling may be the node itself
+            newparent, index = self.__get_insertion(parent, sibling)
+
+            if newparent is oldparent and index > iter.index:
+                index -= 1
+
+            del oldparent.children[iter.index]
+            self.__renumber(oldparent, iter.index)
+            self.__order = None
+
+            if len(oldparent.children) == 0:
+                oldparent.children = None
+
+            # subclasses are told about the removal while the node is unlinked
+            self.node_removed(oldparent is not self.__root and oldparent or None, oldpath)
+
+            if newparent.children is None:
+                newparent.children = []
+
+            iter.parent = newparent
+            iter.index = self.__get_position(newparent.children, iter.key, index)
+            newparent.children.insert(iter.index, iter)
+            self.__renumber(newparent, iter.index)
+            self.__order = None
+
+            self.changed = True
+            self.node_moved(iter)
+
+        return iters
+
+    def move_entry(self, iter, parent = None, sibling = None):
+        "Moves an entry along with its children"
+
+        return self.move_entries([iter], parent, sibling)[0]
+
+    def node_added(self, iter):
+        "Called after a node has been added, for subclasses which track changes"
+
+        pass
+
+    def node_changed(self, iter):
+        "Called after the data of a node has changed, for subclasses which track changes"
+
+        pass
+
+    def node_moved(self, iter):
+        "Called after a moved node has been inserted at its new position, node_removed() having been called for its old one"
+
+        pass
+
+    def node_removed(self, parent, path):
+        "Called after a node has been removed, for subclasses which track changes"
+
+        pass
+
+    def nodes_added(self, parent, iters):
+        "Called after nodes have been added below a parent in bulk, with the new children in order"
+
+        pass
+
+    def nodes_reordered(self, parent, order):
+        "Called after the children of a node were reordered, with their old positions"
+
+        pass
+
+    def remove_entry(self, iter):
+        "Removes an entry, and its children if any"
+
+        if iter is None:
+            return None
+
+        path = self.get_path(iter)
+        self.__log_change("remove", path)
+
+        parent = iter.parent
+        del parent.children[iter.index]
+        self.__renumber(parent, iter.index)
+        self.__order = None
+
+        if len(parent.children) == 0:
+            parent.children = None
+
+        # forget the ids and values of the removed nodes
+        stack = [iter]
+
+        while len(stack) > 0:
+            node = stack.pop()
+            del self.__nodes[node.id]
+            self.__index_entry(node, node.entry, -1)
+            stack.extend(node.children or [])
+
+        self.changed = True
+        self.node_removed(self.iter_parent(iter), path)
+
+    def set_sort_order(self, casefold = True, natural = False, foldersfirst = False):
+        "Sets how entries are sorted, and resorts them"
+
+        if (casefold, natural, foldersfirst) == (self.__casefold, self.__natural, self.__foldersfirst):
+            return
+
+        self.__casefold, self.__natural, self.__foldersfirst = casefold, natural, foldersfirst
+
+        # resort parents before their children, so the paths reported are always current
+        stack = [self.__root]
+
+        while len(stack) > 0:
+            parent = stack.pop()
+
+            if parent.children is None:
+                continue
+
+            for node in parent.children:
+                node.key = self.__get_key(node)
+
+            children = sorted(parent.children, key = lambda node: node.key)
+
+            if children != parent.children:
+                order = [node.index for node in children]
+                parent.children = children
+                self.__renumber(parent, 0)
+                self.__order = None
+
+                self.nodes_reordered(parent is not self.__root and parent or None, order)
+
+            stack.extend(reversed(children))
+
+    def sort_iters(self, iters):
+        "Sorts nodes in pre-order"
+
+        self.__get_order()
+
+        return sorted(iters, key = lambda node: node.position)
+
+    def update_entry(self, iter, e):
+        "Updates an entry"
+
+        if None in (iter, e):
+            return None
+
+        # the path is logged before updating, since a rename may move the node
+        path = self.get_path(iter)
+
+        self.__index_entry(iter, iter.entry, -1)
+
+        iter.entry = self.__get_stored(e)
+        iter.key = self.__get_key(iter)
+        iter.haystack = None
+        self.changed = True
+
+        self.__index_entry(iter, iter.entry, 1)
+
+        # move the node if its new name belongs elsewhere among its siblings
+        children = iter.parent.children
+        old = iter.index
+        del children[old]
+
+        new = self.__get_position(children, iter.key, old)
+        children.insert(new, iter)
+
+        if new != old:
+            self.__renumber(iter.parent, min(old, new), max(old, new) + 1)
+            self.__order = None
+
+            order = list(range(len(children)))
+            order.insert(new, order.pop(old))
+            self.nodes_reordered(self.iter_parent(iter), order)
+
+        self.node_changed(iter)
+
+        self.__log_change("update", path, iter.entry)
+
+
+class Node(object):
+    "A node in an entry tree"
+
+    __slots__ = ("id", "parent", "index", "children", "entry", "icon", "key", "position", "haystack")
+
+    def __init__(self, id, parent, index, e):
+        self.id         = id
+        self.parent     = parent
+        self.index      = index
+        self.children   = None
+        self.entry      = e
+        self.icon       = None
+        self.key        = None
+        self.position   = None
+        self.haystack   = None
+
+
+class SearchIndex(object):
+    "An index of the nodes whose searchable values contain each sequence of three characters"
+
+    def __init__(self):
+        self.postings   = {}
+
+    def __get_trigrams(self, items):
+        "Gets the sequences of three characters in a list of strings, ignoring case and accents"
+
+        trigrams = set()
+
+        # text is folded as loosely as any search folds it, so the nodes
+        # found always include those which match with stricter folding
+        for item in items:
+            item = util.fold_text(item, True)
+            trigrams.update(item[i:i + 3] for i in range(len(item) - 2))
+
+        return trigrams
+
+    def get_candidates(self, string):
+        "Gets the nodes which may contain a string, or None if the string is too short to tell"
+
+        trigrams = self.__get_trigrams([string])
+
+        if len(trigrams) == 0:
+            return None
+
+        postings = sorted((self.postings.get(trigram, ()) for trigram in trigrams), key = len)
+
+        if len(postings[0]) == 0:
+            return set()
+
+        return set(postings[0]).intersection(*postings[1:])
+
+    def index(self, node, e, change):
+        "Adds a node to, or removes it from, the postings of the values of its entry"
+
+        # secret values are left out, so they are never kept in the index
+        items = [e.name, e.description, e.notes]
+        items.extend(value for fieldtype, value in zip(e.fieldtypes, e.values) if value and fieldtype.datatype != entry.DATATYPE_PASSWORD)
+
+        for trigram in self.__get_trigrams(items):
+            if change > 0:
+                self.postings.setdefault(trigram, set()).add(node)
+
+            else:
+                nodes = self.postings[trigram]
+                nodes.discard(node)
+
+                if len(nodes) == 0:
+                    del self.postings[trigram]
+
+
+class SnapshotNode(object):
+    "A node in an entry snapshot"
+
+    def __init__(self, e, parent, index):
+        self.entry      = e
+        self.parent     = parent
+        self.index      = index
+        self.children   = []
+
+
+class ValueCounter(object):
+    "Counts how often values are used, grouped by count so the most used are found without a scan"
+
+    def __init__(self):
+        self.counts     = {}
+        self.values     = {}
+        self.order      = []
+
+    def count(self, value, change):
+        "Adds to or subtracts from the count of a value, ignoring empty ones"
+
+        if value == "":
+            return
+
+        old = self.counts.get(value, 0)
+        new = old + change
+
+        if old > 0:
+            self.values[old].discard(value)
+
+            if len(self.values[old]) == 0:
+                del self.values[old]
+                del self.order[bisect.bisect_left(self.order, old)]
+
+        if new > 0:
+            self.counts[value] = new
+
+            if new not in self.values:
+                self.values[new] = set()
+                bisect.insort(self.order, new)
+
+            self.values[new].add(value)
+
+        else:
+            self.counts.pop(value, None)
+
+    def get_common(self, threshold = 1, limit = None):
+        "Gets the values counted at least threshold times, most used first, up to a limit"
+
+        common = []
+
+        for count in reversed(self.order):
+            if count < threshold or (limit is not None and len(common) >= limit):
+                break
+
+            common.extend(sorted(self.values[count]))
+
+        return common[:limit]
+
+
+class ValuePool(object):
+    "A pool of field values, so equal values are stored once, which counts their uses to drop unused ones and keeps count of the memory saved"
+
+    def __init__(self):
+        self.values     = {}
+        self.counts     = {}
+        self.shared     = 0
+        self.saved      = 0
+
+    def count(self, value, change):
+        "Adds to or subtracts from the uses of a value, dropping it from the pool once it is unused"
+
+        if type(value) != str or value == "":
+            return
+
+        old = self.counts.get(value, 0)
+        new = max(old + change, 0)
+
+        # every use beyond the first shares the pooled copy
+        shared = max(new - 1, 0) - max(old - 1, 0)
+        self.shared += shared
+        self.saved += shared * sys.getsizeof(value)
+
+        if new > 0:
+            self.counts[value] = new
+
+        else:
+            self.counts.pop(value, None)
+            self.values.pop(value, None)
+
+    def get(self, value):
+        "Gets the pooled copy of a value, adding the value if it is new"
+
+        # the empty string is shared by Python itself
+        if type(value) != str or value == "":
+            return value
+
+        return self.values.setdefault(value, value)
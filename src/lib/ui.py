@@ -23,7 +23,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
-from . import config, data, dialog, entry, io, util
+from . import config, dialog, entry, io, store, util
 
 import gettext
 import time
@@ -133,7 +133,7 @@ def generate_field_edit_widget(field, cfg = None, userdata = None):
     if type(field) == entry.PasswordField:
         widget = PasswordEntryGenerate(None, cfg, userdata)
 
-    elif type(field) == entry.UsernameField:
+    elif type(field) in (entry.UsernameField, entry.EmailField):
         widget = Gtk.ComboBox.new_with_entry()
         setup_comboboxentry(widget, userdata)
 
@@ -781,7 +781,7 @@ class TreeView(Gtk.TreeView):
 
         # display popup on right-click
         elif data.button == 3:
-            if path is not None and not self.selection.iter_is_selected(self.model.get_iter(path[0])):
+            if path is not None and not self.selection.path_is_selected(path[0]):
                 self.set_cursor(path[0], path[1], False)
 
             self.emit("popup", data)
@@ -789,7 +789,7 @@ class TreeView(Gtk.TreeView):
             return True
 
         # handle drag-and-drop of multiple rows
-        elif self.__cbid_drag_motion is None and data.button in (1, 2) and data.type == Gdk.EventType.BUTTON_PRESS and path is not None and self.selection.iter_is_selected(self.model.get_iter(path[0])) and len(self.get_selected()) > 1:
+        elif self.__cbid_drag_motion is None and data.button in (1, 2) and data.type == Gdk.EventType.BUTTON_PRESS and path is not None and self.selection.path_is_selected(path[0]) and len(self.get_selected()) > 1:
             self.__cbid_drag_motion = self.connect("motion-notify-event", self.__cb_drag_motion, data.copy())
             self.__cbid_drag_end = self.connect("button-release-event", self.__cb_button_release, data.copy())
 
@@ -828,13 +828,13 @@ class TreeView(Gtk.TreeView):
     def collapse_row(self, iter):
         "Collapse a tree row"
 
-        Gtk.TreeView.collapse_row(self, self.model.get_path(iter))
+        Gtk.TreeView.collapse_row(self, Gtk.TreePath(self.model.get_path(iter)))
 
     def expand_row(self, iter):
         "Expand a tree row"
 
         if iter is not None and self.model.iter_n_children(iter) > 0:
-            Gtk.TreeView.expand_row(self, self.model.get_path(iter), False)
+            Gtk.TreeView.expand_row(self, Gtk.TreePath(self.model.get_path(iter)), False)
 
     def expand_to_iter(self, iter):
         "Expand all items up to and including a given iter"
@@ -851,30 +851,30 @@ class TreeView(Gtk.TreeView):
         if self.model is None:
             return None
 
-        iter = self.model.get_iter(self.get_cursor()[0])
+        path = self.get_cursor()[0]
 
-        if iter is None or not self.selection.iter_is_selected(iter):
+        if path is None or not self.selection.path_is_selected(path):
             return None
 
-        return iter
+        return self.model.get_iter(path)
 
     def get_selected(self):
         "Get a list of currently selected rows"
 
-        list = []
-        self.selection.selected_foreach(lambda model, path, iter: list.append(iter))
+        model, paths = self.selection.get_selected_rows()
 
-        return list
+        return [self.model.get_iter(path) for path in paths]
 
     def select(self, iter):
         "Select a particular row"
 
-        if iter is None:
+        # rows may be hidden by filtered models, which have no path for them
+        if iter is None or self.model.get_path(iter) is None:
             self.unselect_all()
 
         else:
             self.expand_to_iter(iter)
-            self.set_cursor(self.model.get_path(iter))
+            self.set_cursor(Gtk.TreePath(self.model.get_path(iter)))
 
     def select_all(self):
         "Select all rows in the tree"
@@ -895,7 +895,7 @@ class TreeView(Gtk.TreeView):
         if iter is None:
             return
 
-        elif self.row_expanded(self.model.get_path(iter)):
+        elif self.row_expanded(Gtk.TreePath(self.model.get_path(iter))):
             self.collapse_row(iter)
 
         else:
@@ -927,12 +927,12 @@ class EntryTree(TreeView):
 
         cr = Gtk.CellRendererPixbuf()
         column.pack_start(cr, False)
-        column.add_attribute(cr, "icon-name", data.COLUMN_ICON)
+        column.add_attribute(cr, "icon-name", store.COLUMN_ICON)
         cr.set_property("stock-size", ICON_SIZE_TREEVIEW)
 
         cr = Gtk.CellRendererText()
         column.pack_start(cr, True)
-        column.add_attribute(cr, "text", data.COLUMN_NAME)
+        column.add_attribute(cr, "text", store.COLUMN_NAME)
 
         self.connect("doubleclick", self.__cb_doubleclick)
         self.connect("row-expanded", self.__cb_row_expanded)
@@ -944,19 +944,21 @@ class EntryTree(TreeView):
         if type(self.model.get_entry(iter)) == entry.FolderEntry:
             self.stop_emission("doubleclick")
 
-    def __cb_row_collapsed(self, object, iter, extra):
+    def __cb_row_collapsed(self, object, treeiter, path):
         "Updates folder icons when collapsed"
 
-        self.model.folder_expanded(iter, False)
+        self.model.folder_expanded(self.model.get_iter(path), False)
 
-    def __cb_row_expanded(self, object, iter, extra):
+    def __cb_row_expanded(self, object, treeiter, path):
         "Updates folder icons when expanded"
 
+        iter = self.model.get_iter(path)
+
         # make sure all children are collapsed (some may have lingering expand icons)
         for i in range(self.model.iter_n_children(iter)):
             child = self.model.iter_nth_child(iter, i)
 
-            if not self.row_expanded(self.model.get_path(child)):
+            if not self.row_expanded(Gtk.TreePath(self.model.get_path(child))):
                 self.model.folder_expanded(child, False)
 
         self.model.folder_expanded(iter, True)
@@ -1221,6 +1223,17 @@ class Searchbar(Gtk.Toolbar):
         toolitem.add(box)
         self.insert(toolitem, -1)
 
+        # the best matches are listed in a popover, which leaves the focus in the entry
+        self.results = []
+        self.resultlist = Gtk.ListBox()
+        self.resultlist.connect("row-activated", self.__cb_result_activated)
+
+        self.popover = Gtk.Popover()
+        self.popover.set_relative_to(self.entry)
+        self.popover.set_position(Gtk.PositionType.BOTTOM)
+        self.popover.set_modal(False)
+        self.popover.add(self.resultlist)
+
         self.connect("show", self.__cb_show)
 
         self.entry.connect("changed", self.__cb_entry_changed)
@@ -1237,6 +1250,9 @@ class Searchbar(Gtk.Toolbar):
         self.button_next.set_sensitive(s)
         self.button_prev.set_sensitive(s)
 
+        if not s:
+            self.popover.popdown()
+
     def __cb_key_press(self, widget, data = None):
         "Callback for key presses"
 
@@ -1250,8 +1266,42 @@ class Searchbar(Gtk.Toolbar):
 
             return True
 
+        # down, moves to the best matches
+        elif data.keyval == Gdk.KEY_Down and self.popover.get_visible():
+            self.resultlist.get_row_at_index(0).grab_focus()
+
+            return True
+
+    def __cb_result_activated(self, widget, row, data = None):
+        "Callback for activated results"
+
+        self.popover.popdown()
+        self.emit("result-activated", self.results[row.get_index()][2])
+
     def __cb_show(self, widget, data = None):
         "Callback for widget display"
 
         self.entry.select_region(0, -1)
         self.entry.grab_focus()
+
+    def set_results(self, results):
+        "Lists the best matches of a search below the entry, as ( name, icon, data ) tuples"
+
+        self.results = results
+
+        for row in self.resultlist.get_children():
+            self.resultlist.remove(row)
+
+        for name, icon, data in results:
+            self.resultlist.add(ImageLabel(util.escape_markup(name), icon, ICON_SIZE_ENTRY))
+
+        if len(results) > 0 and self.entry.get_text() != "":
+            self.resultlist.show_all()
+            self.popover.popup()
+
+        else:
+            self.popover.popdown()
+
+
+GObject.signal_new("result-activated", Searchbar, GObject.SignalFlags.ACTION,
+                   GObject.TYPE_BOOLEAN, (GObject.TYPE_PYOBJECT, ))
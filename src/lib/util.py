@@ -33,11 +33,24 @@ import secrets
 import shlex
 import string
 import traceback
+import unicodedata
 from io import StringIO
 
 _ = gettext.gettext
 
 
+# scores for fuzzy matches, in the style of fzf: each matched character scores, with bonuses
+# for characters starting words and for runs of characters, and penalties for gaps between them,
+# and matches starting the text score extra
+FUZZY_MATCH         = 16
+FUZZY_GAP_START     = -3
+FUZZY_GAP_EXTEND    = -1
+FUZZY_BOUNDARY      = 8
+FUZZY_CAMELCASE     = 7
+FUZZY_CONSECUTIVE   = 4
+FUZZY_PREFIX        = 8
+
+
 class SubstFormatError(Exception):
     "Exception for parse_subst format errors"
     pass
@@ -175,6 +188,84 @@ def execute_child(command):
     return os.spawnvp(os.P_NOWAIT, items[0], items)  # nosec
 
 
+def fold_text(text, stripaccents = False):
+    "Folds text for case-insensitive matching, optionally without accents"
+
+    # ascii text only has case to fold, which is by far the most common case
+    if text.isascii():
+        return text.lower()
+
+    # compatibility forms may fold to other cases and the reverse, so it is normalized both before and after
+    text = unicodedata.normalize("NFKC", unicodedata.normalize("NFKC", text).casefold())
+
+    if stripaccents:
+        text = unicodedata.normalize("NFC", "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c)))
+
+    return text
+
+
+def fuzzy_score(pattern, text, casesensitive = False):
+    "Scores how well the characters of a pattern match a text in order, returns None if they don't"
+
+    if not pattern:
+        return None
+
+    search = text
+
+    if not casesensitive:
+        pattern, search = pattern.lower(), text.lower()
+
+    # find where the first match ends, then the shortest match ending there
+    end = -1
+
+    for char in pattern:
+        end = search.find(char, end + 1)
+
+        if end < 0:
+            return None
+
+    start = end + 1
+
+    for char in reversed(pattern):
+        start = search.rfind(char, 0, start)
+
+    # word boundaries are found in the original text, unless lowering changed its length
+    if len(search) != len(text):
+        text = search
+
+    score, previous, runbonus = start == 0 and FUZZY_PREFIX or 0, None, 0
+    position = start - 1
+
+    for char in pattern:
+        position = search.find(char, position + 1)
+        char, prev = text[position], position > 0 and text[position - 1] or " "
+
+        if not prev.isalnum() or not char.isalnum():
+            bonus = FUZZY_BOUNDARY
+
+        elif (prev.islower() and char.isupper()) or (prev.isalpha() and char.isdigit()):
+            bonus = FUZZY_CAMELCASE
+
+        else:
+            bonus = 0
+
+        # characters in a run get at least the bonus of its first one
+        if previous is not None and position == previous + 1:
+            bonus = max(bonus, runbonus, FUZZY_CONSECUTIVE)
+
+        else:
+            if previous is not None:
+                score += FUZZY_GAP_START + FUZZY_GAP_EXTEND * (position - previous - 2)
+
+            runbonus = bonus
+
+        # the first character counts double, so prefixes and word starts rank first
+        score += FUZZY_MATCH + (previous is None and 2 * bonus or bonus)
+        previous = position
+
+    return score
+
+
 def generate_password(length, punctuation):
     "Generates a password"
 
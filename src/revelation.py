@@ -27,11 +27,12 @@ import locale
 import os
 import pwd
 import sys
+import threading
 import urllib.parse
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, Gio, GLib  # noqa: E402
-from revelation import config, data, datahandler, dialog, entry, io, ui, util  # noqa: E402
+from revelation import config, data, datahandler, dialog, entry, io, store, ui, util  # noqa: E402
 
 _ = gettext.gettext
 
@@ -328,7 +329,7 @@ class Revelation(ui.App):
         "Sets up various facilities"
 
         self.clipboard      = data.Clipboard()
-        self.datafile       = io.DataFile(datahandler.Revelation2)
+        self.datafile       = io.DataFile(datahandler.Revelation3)
         self.entryclipboard = data.EntryClipboard()
         self.entrystore     = data.EntryStore()
         self.entrysearch    = data.EntrySearch(self.entrystore)
@@ -336,13 +337,33 @@ class Revelation(ui.App):
         self.locktimer      = data.Timer()
         self.undoqueue      = data.UndoQueue()
 
+        # log changes, so autosaves only need to journal them
+        self.entrystore.changelog = []
+
         self.datafile.connect("changed", lambda w, f: self.__state_file(f))
         self.datafile.connect("content-changed", self.__cb_file_content_changed)
+        self.datafile.connect("journal-damaged", self.__cb_file_journal_damaged)
+        self.datafile.connect("save-finished", self.__cb_file_save_finished)
+        self.datafile.connect("save-failed", self.__cb_file_save_failed)
         self.entryclipboard.connect("content-toggled", lambda w, d: self.__state_clipboard(d))
         self.locktimer.connect("ring", self.__cb_file_autolock)
         self.undoqueue.connect("changed", lambda w: self.__state_undo(self.undoqueue.get_undo_action(), self.undoqueue.get_redo_action()))
 
         self.config.connect("changed::file-autolock-timeout", lambda w, k: self.locktimer.start(60 * w.get_int(k)))
+        self.config.connect("changed::file-kdf", self.__cb_config_kdf)
+        self.config.connect("changed::file-kdf-time", self.__cb_config_kdf)
+        self.__cb_config_kdf(self.config, None)
+        self.config.connect("changed::file-threads", lambda w, k: self.datafile.set_threads(w.get_int(k)))
+        self.datafile.set_threads(self.config.get_int("file-threads"))
+        self.config.connect("changed::search-fuzzy", self.__cb_config_search)
+        self.config.connect("changed::search-ignore-accents", self.__cb_config_search)
+        self.__cb_config_search(self.config, None)
+
+        self.config.connect("changed::view-sort-casefold", self.__cb_config_sort)
+        self.config.connect("changed::view-sort-folders-first", self.__cb_config_sort)
+        self.config.connect("changed::view-sort-natural", self.__cb_config_sort)
+        self.__cb_config_sort(self.config, None)
+
         if self.config.get_boolean("file-autolock"):
             self.locktimer.start(60 * self.config.get_int("file-autolock-timeout"))
 
@@ -489,6 +510,9 @@ class Revelation(ui.App):
         self.searchbar.button_next.connect("clicked", self.__cb_searchbar_button_clicked, data.SEARCH_NEXT)
         self.searchbar.button_prev.connect("clicked", self.__cb_searchbar_button_clicked, data.SEARCH_PREVIOUS)
         self.searchbar.entry.connect("changed", lambda w: self.__state_find(self.searchbar.entry.get_text()))
+        self.searchbar.entry.connect("changed", lambda w: self.__entry_filter(self.searchbar.entry.get_text(), self.searchbar.dropdown.get_active_type()))
+        self.searchbar.dropdown.connect("changed", lambda w: self.__entry_filter(self.searchbar.entry.get_text(), self.searchbar.dropdown.get_active_type()))
+        self.searchbar.connect("result-activated", lambda w, iter: self.tree.select(iter))
 
         self.tree.connect("popup", lambda w, d: self.popup(self.popupmenu, d.button, d.time))
         self.tree.connect("doubleclick", self.__cb_tree_doubleclick)
@@ -672,6 +696,43 @@ class Revelation(ui.App):
         if len(files) > 0:
             self.file_open(files[0])
 
+    def __cb_entry_filtered(self, string, matches, ranked):
+        "Shows the entries matching a search as it is typed, and lists the best ones"
+
+        if self.file_locked:
+            return
+
+        activeiter = self.tree.get_active()
+        model = self.tree.model
+
+        if not isinstance(model, data.EntryFilter):
+            model = data.EntryFilter(self.entrystore)
+
+        model.set_matches(matches)
+
+        if model is not self.tree.model:
+            self.tree.set_model(model)
+
+        # keep the active entry if it is still shown, or go to the first match
+        if activeiter is None or model.get_path(activeiter) is None:
+            activeiter = len(matches) > 0 and matches[0] or None
+
+        self.tree.expand_all()
+        self.tree.select(activeiter)
+
+        results = [(self.entrystore.get_entry(iter), iter) for iter in ranked]
+        self.searchbar.set_results([(e.name, e.icon, iter) for e, iter in results])
+
+        context = self.searchbar.entry.get_style_context()
+
+        if len(matches) > 0:
+            self.statusbar.set_status(_('Match found for “%s”') % string)
+            context.remove_class(Gtk.STYLE_CLASS_ERROR)
+
+        else:
+            self.statusbar.set_status(_('No match found for “%s”') % string)
+            context.add_class(Gtk.STYLE_CLASS_ERROR)
+
     def __cb_event_filter(self, event):
         "Event filter for gdk window"
 
@@ -707,6 +768,24 @@ class Revelation(ui.App):
         except dialog.CancelError:
             self.statusbar.set_status(_('Open cancelled'))
 
+    def __cb_file_journal_damaged(self, widget, file):
+        "Callback for journals which could only be restored in part"
+
+        dialog.Error(self.window, _('Changes not restored'), _('Some changes made to the file \'%s\' since it was last saved could not be restored. A copy of them has been kept in \'%s\'.') % (io.file_get_display_name(file), io.file_get_display_name(io.file_journal_backup(file)))).run()
+
+    def __cb_file_save_failed(self, widget, file):
+        "Callback for failed background saves"
+
+        self.entrystore.changed = True
+        self.statusbar.set_status(_('Unable to save file %s') % self.datafile.get_file_display_path())
+
+    def __cb_file_save_finished(self, widget, file):
+        "Callback for finished background saves"
+
+        # only clear the flag if nothing has changed since the save was requested
+        if not self.datafile.get_saving() and len(self.entrystore.changelog) == 0:
+            self.entrystore.changed = False
+
     def __cb_file_autolock(self, widget, data = None):
         "Callback for locking the file"
 
@@ -748,6 +827,7 @@ class Revelation(ui.App):
         if data.keyval == Gdk.KEY_Escape:
             context = widget.get_style_context()
             context.remove_class(Gtk.STYLE_CLASS_ERROR)
+            widget.set_text("")
             self.config.set_boolean("view-searchbar", False)
 
     def __cb_tree_doubleclick(self, widget, iter):
@@ -769,14 +849,15 @@ class Revelation(ui.App):
         sourceiters = self.entrystore.filter_parents(self.tree.get_selected())
         destrow = self.tree.get_dest_row_at_pos(x, y)
 
+        # the drop position is a path in the tree, which may show a filtered view
         if destrow is None:
-            destpath = (self.entrystore.iter_n_children(None) - 1, )
+            destpath = (self.tree.model.iter_n_children(None) - 1, )
             pos = Gtk.TreeViewDropPosition.AFTER
 
         else:
             destpath, pos = destrow
 
-        destiter = self.entrystore.get_iter(destpath)
+        destiter = self.tree.model.get_iter(destpath)
         destpath = self.entrystore.get_path(destiter)
 
         # avoid drops to current iter or descentants
@@ -850,6 +931,74 @@ class Revelation(ui.App):
         else:
             self.toolbar.unset_style()
 
+    def __cb_config_kdf(self, config, key, data = None):
+        "Config callback for the key derivation settings"
+
+        # changed settings invalidate the calibrated cost
+        if key is not None:
+            config.set_int("file-kdf-cost", 0)
+
+        algorithm = datahandler.KDF_NAMES.get(config.get_string("file-kdf"), datahandler.KDF().algorithm)
+
+        kdf = datahandler.KDF(algorithm, config.get_int("file-kdf-cost"))
+
+        try:
+            kdf.check_strength()
+            self.datafile.set_kdf(kdf)
+            return
+
+        # a cost of 0, or an invalid or too low one, needs calibration
+        except datahandler.Error:
+            pass
+
+        # benchmarking takes about as long as an unlock, so keep it out of the main loop
+        target = config.get_int("file-kdf-time") / 1000.0
+
+        def store(kdf):
+            if datahandler.KDF_NAMES.get(config.get_string("file-kdf"), kdf.algorithm) == kdf.algorithm:
+                config.set_int("file-kdf-cost", kdf.cost)
+                self.datafile.set_kdf(kdf)
+
+            return False
+
+        def calibrate():
+            kdf = datahandler.calibrate_kdf(algorithm, target)
+            GLib.idle_add(store, kdf)
+
+        threading.Thread(target = calibrate, daemon = True).start()
+
+    def __cb_config_search(self, config, key, data = None):
+        "Config callback for the search settings"
+
+        self.entrysearch.fuzzy = config.get_boolean("search-fuzzy")
+        self.entrysearch.ignoreaccents = config.get_boolean("search-ignore-accents")
+
+        if key is not None:
+            self.__entry_filter(self.searchbar.entry.get_text(), self.searchbar.dropdown.get_active_type())
+
+    def __cb_config_sort(self, config, key, data = None):
+        "Config callback for the sort order settings"
+
+        sortorder = (
+            config.get_boolean("view-sort-casefold"),
+            config.get_boolean("view-sort-natural"),
+            config.get_boolean("view-sort-folders-first")
+        )
+
+        self.datafile.set_sort_order(*sortorder)
+        self.entrystore.set_sort_order(*sortorder)
+
+        if key is None:
+            return
+
+        # resorting moves entries, so recorded paths no longer match them
+        self.undoqueue.clear()
+
+        # and an autosaved journal must not outlive the order it was logged with
+        if self.datafile.get_file() is not None and self.datafile.get_password() is not None and self.config.get_boolean("file-autosave"):
+            self.datafile.save_async(self.entrystore)
+            self.entrystore.changelog = []
+
     # UNDO / REDO CALLBACKS #
 
     def __cb_redo_add(self, name, actiondata):
@@ -880,27 +1029,19 @@ class Revelation(ui.App):
     def __cb_redo_move(self, name, actiondata):
         "Redoes a move action"
 
-        newiters = []
-
-        for prepath, postpath in actiondata:
-            prepath, postpath = list(prepath), list(postpath)
+        moves, parentid, siblingid = actiondata
 
-            # adjust path if necessary
-            if len(prepath) <= len(postpath):
-                if prepath[:-1] == postpath[:len(prepath) - 1]:
-                    if prepath[-1] <= postpath[len(prepath) - 1]:
-                        postpath[len(prepath) - 1] += 1
+        # entries which other undo steps have added again have new ids, and are left alone
+        iters = [self.entrystore.get_node(id) for id, oldparentid, oldsiblingid in moves]
+        iters = [iter for iter in iters if iter is not None]
 
-            newiter = self.entrystore.move_entry(
-                self.entrystore.get_iter(prepath),
-                self.entrystore.get_iter(postpath[:-1]),
-                self.entrystore.get_iter(postpath)
-            )
+        parent, sibling = self.entrystore.get_node(parentid), self.entrystore.get_node(siblingid)
 
-            newiters.append(newiter)
+        if (parentid is not None and parent is None) or len(iters) == 0:
+            return
 
-        if len(newiters) > 0:
-            self.tree.select(newiters[0])
+        self.entrystore.move_entries(iters, parent, sibling)
+        self.tree.select(iters[0])
 
     def __cb_redo_paste(self, name, actiondata):
         "Redoes a paste action"
@@ -954,30 +1095,20 @@ class Revelation(ui.App):
     def __cb_undo_move(self, name, actiondata):
         "Undoes a move action"
 
-        actiondata = actiondata[:]
-        actiondata.reverse()
-
-        newiters = []
-
-        for prepath, postpath in actiondata:
-            prepath, postpath = list(prepath), list(postpath)
+        moves, parentid, siblingid = actiondata
+        iters = []
 
-            # adjust path if necessary
-            if len(postpath) <= len(prepath):
-                if postpath[:-1] == prepath[:len(postpath) - 1]:
-                    if postpath[-1] <= prepath[len(postpath) - 1]:
-                        prepath[len(postpath) - 1] += 1
+        # move the entries back in reverse, so the siblings they had are in place again
+        for id, oldparentid, oldsiblingid in reversed(moves):
+            iter, parent = self.entrystore.get_node(id), self.entrystore.get_node(oldparentid)
 
-            newiter = self.entrystore.move_entry(
-                self.entrystore.get_iter(postpath),
-                self.entrystore.get_iter(prepath[:-1]),
-                self.entrystore.get_iter(prepath)
-            )
+            if iter is None or (oldparentid is not None and parent is None):
+                continue
 
-            newiters.append(newiter)
+            iters.append(self.entrystore.move_entry(iter, parent, self.entrystore.get_node(oldsiblingid)))
 
-        if len(newiters) > 0:
-            self.tree.select(newiters[-1])
+        if len(iters) > 0:
+            self.tree.select(iters[-1])
 
     def __cb_undo_paste(self, name, actiondata):
         "Undoes a paste action"
@@ -1005,6 +1136,21 @@ class Revelation(ui.App):
 
     # PRIVATE METHODS #
 
+    def __entry_filter(self, string, entrytype):
+        "Filters the tree to the entries matching a search, or shows all entries again"
+
+        if string != "":
+            self.entrysearch.filter(string, entrytype, self.__cb_entry_filtered)
+            return
+
+        self.entrysearch.cancel_filter()
+        self.searchbar.entry.get_style_context().remove_class(Gtk.STYLE_CLASS_ERROR)
+
+        if isinstance(self.tree.model, data.EntryFilter):
+            activeiter = self.tree.get_active()
+            self.tree.set_model(self.entrystore)
+            self.tree.select(activeiter)
+
     def __entry_find(self, parent, string, entrytype, direction = data.SEARCH_NEXT):
         "Searches for an entry"
 
@@ -1030,8 +1176,19 @@ class Revelation(ui.App):
             if not self.config.get_boolean("file-autosave"):
                 return
 
-            self.datafile.save(self.entrystore, self.datafile.get_file(), self.datafile.get_password())
-            self.entrystore.changed = False
+            # the changed flag is cleared once the save has finished
+            self.datafile.save_async(self.entrystore, self.entrystore.changelog)
+            self.entrystore.changelog = []
+
+        except IOError:
+            pass
+
+    def __file_flush(self):
+        "Merges the journal into the data file, unless there are unsaved changes"
+
+        try:
+            if not self.entrystore.changed:
+                self.datafile.flush(self.entrystore)
 
         except IOError:
             pass
@@ -1047,17 +1204,25 @@ class Revelation(ui.App):
             if datafile is None:
                 datafile = self.datafile
 
-                # Because there are two fileversion we need to check if we are really dealing
-                # with version two. If we aren't chances are high, that we are
-                # dealing with version one. In this case we use the version one
-                # handler and save the file as version two if it is changed, to
-                # allow seamless upgrades.
-                if not datafile.get_handler().detect(io.file_read(file)):
-                    # Store the datahandler to be reset later on
-                    old_handler = datafile.get_handler()
-                    # Load the revelation fileversion one handler
-                    datafile.set_handler(datahandler.Revelation)
-                    dialog.Info(self.window, _('Old file format'), _('Revelation detected that \'%s\' file has the old and actually non-secure file format. It is strongly recommended to save this file with the new format. Revelation will do it automatically if you press save after opening the file.') % io.file_get_display_name(file)).run()
+                # Because there are several file versions we need to check if we are
+                # really dealing with the current one. If we aren't, we look for the
+                # handler of an older version and save the file in the current
+                # version if it is changed, to allow seamless upgrades. Files which
+                # no handler detects are left to the default one, which will fail
+                # with an appropriate error.
+                input = io.file_read(file)
+
+                if not datafile.get_handler().detect(input):
+                    for handler in (datahandler.Revelation2, datahandler.Revelation):
+                        if handler().detect(input):
+                            # Store the datahandler to be reset later on
+                            old_handler = datafile.get_handler()
+                            datafile.set_handler(handler)
+                            break
+
+                    # version one files are insecure, so warn the user about them
+                    if type(datafile.get_handler()) == datahandler.Revelation:
+                        dialog.Info(self.window, _('Old file format'), _('Revelation detected that \'%s\' file has the old and actually non-secure file format. It is strongly recommended to save this file with the new format. Revelation will do it automatically if you press save after opening the file.') % io.file_get_display_name(file)).run()
 
             while True:
                 try:
@@ -1088,7 +1253,7 @@ class Revelation(ui.App):
             dialog.Error(self.window, _('Unable to open file'), _('The file \'%s\' could not be opened. Make sure that the file exists, and that you have permissions to open it.') % io.file_get_display_name(file)).run()
 
         # If we switched the datahandlers before we need to switch back to the
-        # version2 handler here, to ensure a seamless version upgrade on save
+        # current handler here, to ensure a seamless version upgrade on save
         if old_handler is not None:
             datafile.set_handler(old_handler.__class__)
 
@@ -1150,7 +1315,7 @@ class Revelation(ui.App):
         # store undo data (need paths)
         undoactions = []
         for iter in iters:
-            undostore = data.EntryStore()
+            undostore = store.EntryStore()
             undostore.import_entry(self.entrystore, iter)
             path = self.entrystore.get_path(iter)
             undoactions.append((path, undostore))
@@ -1197,13 +1362,14 @@ class Revelation(ui.App):
             if e is None:
                 d = dialog.EntryEdit(self.window, _('Add Entry'), None, self.config, self.clipboard)
                 d.set_fieldwidget_data(entry.UsernameField, self.__get_common_usernames())
+                d.set_fieldwidget_data(entry.EmailField, self.entrystore.get_popular_values(entry.EmailField, 3))
                 e = d.run()
 
             iter = self.entrystore.add_entry(e, parent, sibling)
 
             self.undoqueue.add_action(
                 _('Add entry'), self.__cb_undo_add, self.__cb_redo_add,
-                (self.entrystore.get_path(iter), e.copy())
+                (self.entrystore.get_path(iter), self.entrystore.get_entry(iter))
             )
 
             self.__file_autosave()
@@ -1228,6 +1394,7 @@ class Revelation(ui.App):
             else:
                 d = dialog.EntryEdit(self.window, _('Edit Entry'), e, self.config, self.clipboard)
                 d.set_fieldwidget_data(entry.UsernameField, self.__get_common_usernames(e))
+                d.set_fieldwidget_data(entry.EmailField, self.entrystore.get_popular_values(entry.EmailField, 3))
 
             n = d.run()
             self.entrystore.update_entry(iter, n)
@@ -1235,7 +1402,7 @@ class Revelation(ui.App):
 
             self.undoqueue.add_action(
                 _('Update entry'), self.__cb_undo_edit, self.__cb_redo_edit,
-                (self.entrystore.get_path(iter), e.copy(), n.copy())
+                (self.entrystore.get_path(iter), e, self.entrystore.get_entry(iter))
             )
 
             self.__file_autosave()
@@ -1262,7 +1429,7 @@ class Revelation(ui.App):
 
             self.undoqueue.add_action(
                 _('Add folder'), self.__cb_undo_add, self.__cb_redo_add,
-                (self.entrystore.get_path(iter), e.copy())
+                (self.entrystore.get_path(iter), self.entrystore.get_entry(iter))
             )
 
             self.__file_autosave()
@@ -1320,20 +1487,18 @@ class Revelation(ui.App):
         if type(sourceiters) != list:
             sourceiters = [sourceiters]
 
-        newiters = []
-        undoactions = []
+        # the nodes keep their ids when moved, so the undo data refers to them by id
+        moves = []
 
         for sourceiter in sourceiters:
-            sourcepath = self.entrystore.get_path(sourceiter)
-            newiter = self.entrystore.move_entry(sourceiter, parent, sibling)
-            newpath = self.entrystore.get_path(newiter)
+            oldparent, oldsibling = self.entrystore.iter_parent(sourceiter), self.entrystore.iter_next(sourceiter)
+            moves.append((sourceiter.id, oldparent and oldparent.id, oldsibling and oldsibling.id))
 
-            undoactions.append((sourcepath, newpath))
-            newiters.append(newiter)
+        newiters = self.entrystore.move_entries(sourceiters, parent, sibling)
 
         self.undoqueue.add_action(
             _('Move entry'), self.__cb_undo_move, self.__cb_redo_move,
-            undoactions
+            (moves, parent and parent.id, sibling and sibling.id)
         )
 
         if len(newiters) > 0:
@@ -1356,7 +1521,7 @@ class Revelation(ui.App):
             # store undo data (need paths)
             undoactions = []
             for iter in iters:
-                undostore = data.EntryStore()
+                undostore = store.EntryStore()
                 undostore.import_entry(self.entrystore, iter)
                 path = self.entrystore.get_path(iter)
                 undoactions.append((path, undostore))
@@ -1397,12 +1562,16 @@ class Revelation(ui.App):
         "Closes the current file"
 
         try:
+            self.datafile.save_wait()
+
             if self.entrystore.changed and dialog.FileChangesClose(self.window).run():
                 if not self.file_save(self.datafile.get_file(), self.datafile.get_password()):
                     raise dialog.CancelError
 
+            self.__file_flush()
             self.clipboard.clear()
             self.entryclipboard.clear()
+            self.searchbar.entry.set_text("")
             self.entrystore.clear()
             self.undoqueue.clear()
             self.statusbar.set_status(_('Closed file %s') % self.datafile.get_file_display_path())
@@ -1476,6 +1645,8 @@ class Revelation(ui.App):
         if password is None:
             return
 
+        # write out pending changes before hiding them
+        self.datafile.save_wait()
         self.locktimer.stop()
         app = Gio.Application.get_default
         app().get_dbus_connection().signal_unsubscribe(self.dbus_subscription_id)
@@ -1485,6 +1656,7 @@ class Revelation(ui.App):
 
         # store current state
         activeiter = self.tree.get_active()
+        activemodel = self.tree.model
         oldtitle = self.get_title()
 
         # clear application contents
@@ -1513,7 +1685,7 @@ class Revelation(ui.App):
             self.quit()
 
         # unlock the file and restore state
-        self.tree.set_model(self.entrystore)
+        self.tree.set_model(activemodel)
         self.tree.select(activeiter)
         self.window.set_title(oldtitle)
         self.statusbar.set_status(_('File unlocked'))
@@ -1530,10 +1702,14 @@ class Revelation(ui.App):
         "Opens a new file"
 
         try:
+            self.datafile.save_wait()
+
             if self.entrystore.changed and dialog.FileChangesNew(self.window).run():
                 if not self.file_save(self.datafile.get_file(), self.datafile.get_password()):
                     raise dialog.CancelError
 
+            self.__file_flush()
+            self.searchbar.entry.set_text("")
             self.entrystore.clear()
             self.datafile.close()
             self.undoqueue.clear()
@@ -1546,6 +1722,8 @@ class Revelation(ui.App):
         "Opens a data file"
 
         try:
+            self.datafile.save_wait()
+
             if self.entrystore.changed and dialog.FileChangesOpen(self.window).run():
                 if not self.file_save(self.datafile.get_file(), self.datafile.get_password()):
                     raise dialog.CancelError
@@ -1558,8 +1736,10 @@ class Revelation(ui.App):
             if entrystore is None:
                 return
 
+            self.searchbar.entry.set_text("")
             self.entrystore.clear()
             self.entrystore.import_entry(entrystore, None)
+            self.entrystore.changelog = []
             self.entrystore.changed = False
             self.undoqueue.clear()
 
@@ -1581,6 +1761,7 @@ class Revelation(ui.App):
                 password = dialog.PasswordSave(self.window, io.file_get_display_name(file)).run()
 
             self.datafile.save(self.entrystore, file, password)
+            self.entrystore.changelog = []
             self.entrystore.changed = False
             self.statusbar.set_status(_('Data saved to file %s') % io.file_get_display_path(file))
 
@@ -1614,10 +1795,13 @@ class Revelation(ui.App):
         "Quits the application"
 
         try:
+            self.datafile.save_wait()
+
             if self.entrystore.changed and dialog.FileChangesQuit(self.window).run():
                 if not self.file_save(self.datafile.get_file(), self.datafile.get_password()):
                     raise dialog.CancelError
 
+            self.__file_flush()
             self.clipboard.clear()
             self.entryclipboard.clear()
 
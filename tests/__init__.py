@@ -0,0 +1,87 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Helpers for the tests, which run against src/lib as the installed revelation package
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import atexit
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+
+ROOT    = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE  = os.path.join(ROOT, "src", "lib")
+
+# the values meson fills into config.py.in on install
+CONFIG = {
+    "@pkgdatadir@":     os.path.join(ROOT, "data"),
+    "@datadir@":        os.path.join(ROOT, "data"),
+    "@PACKAGE@":        "revelation",
+    "@VERSION@":        "test",
+}
+
+DEPENDENCIES = ("Cryptodome", "defusedxml", "pwquality")
+
+
+def import_revelation():
+    "Imports the library the way the application does, skipping the test if its dependencies are missing"
+
+    if "revelation" in sys.modules:
+        return sys.modules["revelation"]
+
+    try:
+        import gi
+        gi.require_version("Gtk", "3.0")
+
+    except (ImportError, ValueError):
+        raise unittest.SkipTest("GTK 3 is not available")
+
+    for module in DEPENDENCIES:
+        try:
+            importlib.import_module(module)
+
+        except ImportError:
+            raise unittest.SkipTest("%s is not installed" % module)
+
+    # the library is installed as a package with a generated config module, so it is laid out that way
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, True)
+
+    package = os.path.join(directory, "revelation")
+    shutil.copytree(SOURCE, package, ignore = shutil.ignore_patterns("__pycache__", "config.py.in"))
+
+    with open(os.path.join(SOURCE, "config.py.in")) as input:
+        config = input.read()
+
+    for key, value in CONFIG.items():
+        config = config.replace(key, value)
+
+    with open(os.path.join(package, "config.py"), "w") as output:
+        output.write(config)
+
+    sys.path.insert(0, directory)
+
+    return importlib.import_module("revelation")
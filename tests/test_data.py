@@ -0,0 +1,75 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Tests for searching entries
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from . import import_revelation
+
+import unittest
+
+
+class EntrySearchTests(unittest.TestCase):
+    "Tests searching entries with queries"
+
+    def setUp(self):
+        revelation = import_revelation()
+        self.entry = revelation.entry
+
+        self.entrystore = revelation.store.EntryStore()
+        self.entrysearch = revelation.data.EntrySearch(self.entrystore)
+
+        archive = self.__add(self.entry.FolderEntry, "Archive")
+        self.__add(self.entry.ShellEntry, "old", "rm -rf /tmp/old", archive)
+        self.__add(self.entry.ShellEntry, "build", "make --verbose")
+        self.__add(self.entry.WebEntry, "mail", "")
+
+    def __add(self, entrytype, name, notes = "", parent = None):
+        "Adds an entry with a name and notes"
+
+        e = entrytype()
+        e.name = name
+        e.notes = notes
+
+        return self.entrystore.add_entry(e, parent)
+
+    def __find(self, string):
+        "Gets the names of the entries matching a search string"
+
+        return sorted(self.entrystore.get_entry(iter).name for iter in self.entrysearch.find_all(string))
+
+    def test_negated_clause(self):
+        "Leaves out the entries matching a negated clause"
+
+        self.assertEqual(self.__find("-folder:archive -type:folder"), ["build", "mail"])
+        self.assertEqual(self.__find("-name:mail m"), ["build", "old"])
+
+    def test_negated_text(self):
+        "Searches for terms starting with a dash which are not clauses as text"
+
+        self.assertEqual(self.__find("-rf"), ["old"])
+        self.assertEqual(self.__find("--verbose"), ["build"])
+        self.assertEqual(self.__find("-unknown:key"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Tests for the data handlers
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from . import import_revelation
+
+import unittest
+
+
+class ExportTests(unittest.TestCase):
+    "Tests exporting a populated entrystore"
+
+    def setUp(self):
+        revelation = import_revelation()
+        self.datahandler = revelation.datahandler
+        self.entry = revelation.entry
+
+        self.entrystore = revelation.data.EntryStore()
+
+        folder = self.entry.FolderEntry()
+        folder.name = "Servers"
+        folder.description = "Machines"
+        parent = self.entrystore.add_entry(folder)
+
+        shell = self.entry.ShellEntry()
+        shell.name = "db1"
+        shell[self.entry.HostnameField] = "db1.prod"
+        shell[self.entry.UsernameField] = "deploy"
+        shell[self.entry.PasswordField] = "secret"
+        self.entrystore.add_entry(shell, parent)
+
+        # fields are left unset here
+        website = self.entry.WebEntry()
+        website.name = "Site"
+        self.entrystore.add_entry(website)
+
+    def test_export(self):
+        "Exports the entries with each handler which exports without a password"
+
+        for handler in self.datahandler.get_export_handlers():
+            if handler.encryption:
+                continue
+
+            with self.subTest(handler = handler.__name__):
+                self.assertNotEqual(handler().export_data(self.entrystore), "")
+
+    def test_export_xhtml(self):
+        "Exports the entries as XHTML, which links them by their path"
+
+        xhtml = self.datahandler.XHTML().export_data(self.entrystore)
+
+        self.assertIn("<li class=\"folder\" id=\"entry-0\">", xhtml)
+        self.assertIn("<li class=\"account\" id=\"entry-0-0\">", xhtml)
+        self.assertIn("<a href=\"#entry-0-0\">db1</a>", xhtml)
+        self.assertIn("<td>db1.prod</td>", xhtml)
+
+    def test_export_xml(self):
+        "Exports the entries as XML and imports them again"
+
+        entrystore = self.datahandler.RevelationXML().import_data(self.datahandler.RevelationXML().export_data(self.entrystore))
+        e = entrystore.get_entry(entrystore.get_iter((0, 0)))
+
+        self.assertEqual(e.name, "db1")
+        self.assertEqual(e[self.entry.HostnameField], "db1.prod")
+        self.assertEqual(e[self.entry.PasswordField], "secret")
+
+
+class KDFTests(unittest.TestCase):
+    "Tests the key derivation parameters"
+
+    def setUp(self):
+        self.datahandler = import_revelation().datahandler
+
+    def test_strength(self):
+        "Accepts costs below the minimum when reading files, but not for writing them"
+
+        for algorithm, weak, strong in ((self.datahandler.rvl.KDF_PBKDF2_SHA256, 1, 100000), (self.datahandler.rvl.KDF_SCRYPT, 2 ** 10, 2 ** 14)):
+            kdf = self.datahandler.KDF(algorithm, weak)
+            kdf.check()
+            self.assertRaises(self.datahandler.Error, kdf.check_strength)
+
+            self.datahandler.KDF(algorithm, strong).check_strength()
+
+
+if __name__ == "__main__":
+    unittest.main()
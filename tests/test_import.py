@@ -0,0 +1,54 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Tests for importing the library
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from . import import_revelation
+
+import importlib
+import unittest
+
+
+class ImportTests(unittest.TestCase):
+    "Tests that the library imports the way the application imports it"
+
+    def test_import(self):
+        "Imports the package and the modules the application uses"
+
+        revelation = import_revelation()
+
+        for name in ("config", "data", "datahandler", "dialog", "entry", "io", "store", "ui", "util"):
+            self.assertIs(importlib.import_module("revelation." + name), getattr(revelation, name))
+
+    def test_query_fields(self):
+        "Parses a query with field keys, which needs the entry module loaded"
+
+        revelation = import_revelation()
+        query = revelation.data.EntryQuery("type:shell host:*.prod user:deploy -folder:archive updated:<2024-01-01 backup")
+
+        self.assertTrue(query.scoped)
+        self.assertEqual(query.text, "backup")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Tests for saving data files
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from . import import_revelation
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+
+class DataFileTests(unittest.TestCase):
+    "Tests saving data files in the background"
+
+    def setUp(self):
+        revelation = import_revelation()
+        self.entry = revelation.entry
+        self.io = revelation.io
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.file = os.path.join(self.directory, "test.rvl")
+        self.signals = []
+
+        self.datafile = self.io.DataFile(revelation.datahandler.Revelation3)
+        self.datafile.connect("save-failed", self.__cb_signal)
+
+        self.entrystore = revelation.store.EntryStore()
+        self.__add("mail")
+
+        self.datafile.save(self.entrystore, self.file, "password")
+        self.entrystore.changelog = []
+
+    def __add(self, name):
+        "Adds an entry with a name"
+
+        e = self.entry.WebEntry()
+        e.name = name
+
+        return self.entrystore.add_entry(e)
+
+    def __cb_signal(self, widget, file):
+        "Records the file of an emitted signal"
+
+        self.signals.append(file)
+
+        return False
+
+    def __load(self):
+        "Loads the saved file, with its journal, and gets the names of the entries in it"
+
+        entrystore = self.io.DataFile(None).load(self.file, "password")
+
+        return [entrystore.get_entry(entrystore.iter_nth_child(None, i)).name for i in range(entrystore.iter_n_children(None))]
+
+    def test_failed_save(self):
+        "Saves the whole file again after a full save failed, since its changes were not logged"
+
+        self.__add("bank")
+
+        with mock.patch.object(self.io, "file_write", side_effect = IOError):
+            self.datafile.save_async(self.entrystore)
+            self.entrystore.changelog = []
+            self.datafile.save_wait()
+
+        self.assertEqual(self.signals, [self.datafile.get_file()])
+
+        self.__add("shop")
+        self.datafile.save_async(self.entrystore, self.entrystore.changelog)
+        self.entrystore.changelog = []
+        self.datafile.save_wait()
+
+        self.assertFalse(os.path.exists(self.file + ".journal"))
+        self.assertEqual(self.__load(), ["bank", "mail", "shop"])
+
+    def test_journal_damaged(self):
+        "Keeps a copy of a journal with changes which could not be restored, and reports it"
+
+        self.__add("bank")
+        self.datafile.save_async(self.entrystore, self.entrystore.changelog)
+        self.datafile.save_wait()
+
+        with open(self.file + ".journal", "ab") as journal:
+            journal.write(b"\0" * 64)
+
+        with open(self.file + ".journal", "rb") as journal:
+            data = journal.read()
+
+        datafile = self.io.DataFile(None)
+        datafile.connect("journal-damaged", self.__cb_signal)
+        entrystore = datafile.load(self.file, "password")
+
+        self.assertEqual(self.signals, [self.file])
+        self.assertEqual(entrystore.iter_n_children(None), 2)
+
+        with open(self.file + ".journal.bak", "rb") as backup:
+            self.assertEqual(backup.read(), data)
+
+    def test_key_cache(self):
+        "Saves with a key derived in advance, after both background and direct saves"
+
+        handler = self.datafile.get_handler()
+
+        with mock.patch.object(handler, "export_data", wraps = handler.export_data) as export_data:
+            for i in range(2):
+                self.datafile.save_async(self.entrystore)
+                self.datafile.save_wait()
+
+            self.datafile.save(self.entrystore, self.file, "password")
+            self.datafile.save(self.entrystore, self.file, "password")
+
+        self.assertEqual([len(call.args) for call in export_data.call_args_list], [3, 3, 3, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
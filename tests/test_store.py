@@ -0,0 +1,143 @@
+#
+# Revelation - a password manager for GNOME 2
+# http://oss.codepoet.no/revelation/
+# $Id$
+#
+# Tests for the entry store
+#
+#
+# Copyright (c) 2003-2006 Erik Grinaker
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from . import import_revelation
+
+import unittest
+
+
+class EntryStoreTests(unittest.TestCase):
+    "Tests the entry tree"
+
+    def setUp(self):
+        revelation = import_revelation()
+        self.datahandler = revelation.datahandler
+        self.entry = revelation.entry
+        self.store = revelation.store
+
+    def __add(self, entrystore, entrytype, name, parent = None):
+        "Adds an entry with a name"
+
+        e = entrytype()
+        e.name = name
+
+        return entrystore.add_entry(e, parent)
+
+    def __names(self, entrystore, parent = None):
+        "Gets the names of the children of an entry"
+
+        return [entrystore.get_entry(entrystore.iter_nth_child(parent, i)).name for i in range(entrystore.iter_n_children(parent))]
+
+    def test_move_hooks(self):
+        "Tells subclasses about a moved node being removed while it is unlinked, and then about it being inserted"
+
+        calls = []
+
+        class EntryStore(self.store.EntryStore):
+            def node_moved(self, iter):
+                calls.append(("moved", self.get_path(iter), self.iter_n_children(None)))
+
+            def node_removed(self, parent, path):
+                calls.append(("removed", path, self.iter_n_children(None)))
+
+        entrystore = EntryStore()
+        folder = self.__add(entrystore, self.entry.FolderEntry, "Servers")
+        iter = self.__add(entrystore, self.entry.ShellEntry, "db1", folder)
+        self.__add(entrystore, self.entry.WebEntry, "mail")
+
+        entrystore.move_entry(iter)
+
+        self.assertEqual(calls, [("removed", (1, 0), 2), ("moved", (0, ), 3)])
+        self.assertEqual(entrystore.iter_n_children(folder), 0)
+
+    def test_order(self):
+        "Sorts names regardless of case, with accented letters next to their base letters"
+
+        entrystore = self.store.EntryStore()
+
+        for name in ("Eve", "b", "emma", "Zoe", "Émile", "a"):
+            self.__add(entrystore, self.entry.GenericEntry, name)
+
+        self.assertEqual(self.__names(entrystore), ["a", "b", "Émile", "emma", "Eve", "Zoe"])
+
+    def test_value_pool(self):
+        "Shares equal field values while entries use them, and drops them once no entry does"
+
+        entrystore = self.store.EntryStore()
+        iters = []
+
+        for name in ("mail", "bank"):
+            e = self.entry.WebEntry()
+            e.name = name
+            e[self.entry.UsernameField] = "john"
+            iters.append(entrystore.add_entry(e))
+
+        self.assertEqual(entrystore.valuepool.counts["john"], 2)
+        self.assertEqual(entrystore.valuepool.shared, 1)
+
+        e = entrystore.get_entry(iters[0]).copy()
+        e[self.entry.UsernameField] = "jane"
+        entrystore.update_entry(iters[0], e)
+
+        self.assertEqual(entrystore.valuepool.counts["john"], 1)
+        self.assertEqual(entrystore.valuepool.shared, 0)
+
+        for iter in iters:
+            entrystore.remove_entry(iter)
+
+        self.assertNotIn("john", entrystore.valuepool.values)
+        self.assertNotIn("jane", entrystore.valuepool.values)
+        self.assertEqual(entrystore.valuepool.saved, 0)
+
+    def test_replay(self):
+        "Replays logged changes onto the entries as they were saved"
+
+        entrystore = self.store.EntryStore()
+        folder = self.__add(entrystore, self.entry.FolderEntry, "Servers")
+        self.__add(entrystore, self.entry.ShellEntry, "db1", folder)
+        self.__add(entrystore, self.entry.WebEntry, "école")
+        self.__add(entrystore, self.entry.WebEntry, "mail")
+
+        saved = self.datahandler.RevelationXML().export_data(entrystore)
+        entrystore.changelog = []
+
+        # add, rename, move and remove, so entries change places
+        iter = self.__add(entrystore, self.entry.ShellEntry, "db2", folder)
+        e = entrystore.get_entry(iter).copy()
+        e.name = "app1"
+        entrystore.update_entry(iter, e)
+        entrystore.move_entry(entrystore.iter_nth_child(None, 1), folder)
+        entrystore.remove_entry(entrystore.iter_nth_child(folder, 1))
+
+        replayed = self.datahandler.RevelationXML().import_data(saved)
+
+        self.assertEqual(replayed.apply_changes(entrystore.changelog), len(entrystore.changelog))
+        self.assertEqual(self.datahandler.RevelationXML().export_data(replayed), self.datahandler.RevelationXML().export_data(entrystore))
+        self.assertEqual(self.__names(replayed), ["école", "Servers"])
+        self.assertEqual(self.__names(replayed, replayed.get_iter((1, ))), ["app1", "mail"])
+
+
+if __name__ == "__main__":
+    unittest.main()